@@ -1,4 +1,189 @@
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import functools
 import hashlib
+import itertools
+import json
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Iterable
+from typing import Protocol
+
+import numpy as np
+
+# Tokens used for the dense mock embeddings (lowercase alphanumeric runs).
+_EMBEDDING_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def content_hash(text: str) -> str:
+    """Stable content hash of a text, used as thought id and embedding cache key."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_feature(token: str, dim: int) -> tuple[int, float]:
+    """
+    Maps a token to a (dimension, sign) pair using a stable hash (the "hashing trick").
+    hashlib is used instead of hash() so embeddings are identical across processes.
+    """
+    digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, (1.0 if (digest >> 32) & 1 else -1.0)
+
+
+# --- Embeddings ---
+class EmbeddingModel(Protocol):
+    """
+    What MemoryCache needs from an embedding backend. MockLLMAgent, HashingEmbeddingModel
+    and CachedEmbeddingProvider all implement it, so they can be stacked and swapped freely.
+    A model may also set whitespace_insensitive = True when texts that differ only in whitespace
+    always get the same embedding; the recall cache then shares entries between such queries.
+    """
+    def get_embedding(self, text: str) -> int | np.ndarray: ...
+
+    def get_embeddings(self, texts: list[str]) -> np.ndarray: ...
+
+
+class HashingEmbeddingModel:
+    """
+    A deterministic, local stand-in for an embedding model: a hashed bag-of-words vector.
+    Texts sharing words end up close to each other, which is what random-projection LSH needs.
+    An optional latency (seconds per call) simulates the model round-trip for offline benchmarks.
+    """
+    whitespace_insensitive = True # Only the words of a text count
+
+    def __init__(self, embedding_dim: int = 64, latency: float = 0.0):
+        self.embedding_dim = embedding_dim
+        self.latency = latency
+        self.calls = 0 # Number of round-trips made to the "model"
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_embedding(self, text: str) -> np.ndarray:
+        """Embeds one text into a unit-length float32 vector."""
+        self._round_trip()
+        vector = np.zeros(self.embedding_dim, dtype=np.float32)
+        for token in _EMBEDDING_TOKEN_RE.findall(text.lower()):
+            dim_idx, sign = _token_feature(token, self.embedding_dim)
+            vector[dim_idx] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm # Unit length, so only the direction matters for hashing
+        return vector
+
+    def get_embeddings(self, texts: list[str]) -> np.ndarray:
+        """Embeds a batch of texts into a (len(texts), embedding_dim) float32 matrix in one round-trip."""
+        self._round_trip()
+        # Collect every (row, dimension, sign) feature of the batch, then scatter-add them in one call.
+        rows, dims, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in _EMBEDDING_TOKEN_RE.findall(text.lower()):
+                dim_idx, sign = _token_feature(token, self.embedding_dim)
+                rows.append(row)
+                dims.append(dim_idx)
+                signs.append(sign)
+        matrix = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(dims, dtype=np.intp)), np.array(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0) # Unit length, so only the direction matters
+        return matrix
+
+
+class CachedEmbeddingProvider:
+    """
+    Wraps an embedding model with a bounded LRU cache keyed by the content hash of the text.
+    Repeated texts (the same thought on insert, recall, rehash, ...) only reach the model once
+    while they stay in the cache. Batch lookups send all misses to the model in a single call.
+    """
+    def __init__(self, model: EmbeddingModel, max_size: int = 100_000):
+        if max_size < 0:
+            raise ValueError(f"max_size must be >= 0, got {max_size}.")
+        self.model = model
+        self.max_size = max_size
+        self._cache: collections.OrderedDict[str, int | np.ndarray] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # One provider can be shared by several memory shards and background organizers.
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Pickled (e.g. for organize worker processes) as the model and size only: the copy starts empty.
+        return CachedEmbeddingProvider, (self.model, self.max_size)
+
+    @property
+    def whitespace_insensitive(self) -> bool:
+        return getattr(self.model, "whitespace_insensitive", False)
+
+    def _lookup(self, key: str):
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            return embedding
+
+    def _store(self, key: str, embedding):
+        if not self.max_size:
+            return
+        if isinstance(embedding, np.ndarray):
+            embedding.flags.writeable = False # Shared between callers; must not be modified in place
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False) # Evict the least recently used entry
+
+    def get_embedding(self, text: str) -> int | np.ndarray:
+        key = content_hash(text)
+        embedding = self._lookup(key)
+        if embedding is None:
+            embedding = self.model.get_embedding(text)
+            self._store(key, embedding)
+        return embedding
+
+    def get_embeddings(self, texts: list[str]) -> np.ndarray:
+        """Batch lookup: cached rows are reused, all (distinct) misses are embedded in one model call."""
+        keys = [content_hash(t) for t in texts]
+        found = [self._lookup(key) for key in keys]
+        missing: dict[str, str] = {} # key -> text, deduplicated within the batch
+        for key, text, embedding in zip(keys, texts, found):
+            if embedding is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = dict(zip(missing, self.model.get_embeddings(list(missing.values()))))
+            for key, embedding in computed.items():
+                self._store(key, embedding)
+            found = [computed[key] if embedding is None else embedding for key, embedding in zip(keys, found)]
+        if not texts:
+            return self.model.get_embeddings([])
+        return np.asarray(found)
+
+    def stats(self) -> dict[str, float]:
+        """Hit/miss counters and current size of the cache."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
 
 # --- Mock LLM Agent ---
 class MockLLMAgent:
@@ -6,15 +191,50 @@ class MockLLMAgent:
     A mock class to simulate LLM behavior for generating thoughts,
     responses, embeddings, and decisions for memory organization.
     """
-    def get_embedding(self, text: str) -> int:
+    # Contradictory facts from Figure 4: when both are remembered, the second one is forgotten.
+    _CHINA_CAPITAL_FACTS = frozenset({"The capital of China is Beijing.", "The capital of China is Shanghai."})
+
+    def __init__(self, embedding_dim: int | None = None, latency: float = 0.0):
+        # None keeps the original scalar (sum of ASCII values) embedding used by SimpleLSH.
+        # An integer switches to dense float vectors of that size, as needed by RandomProjectionLSH.
+        self.embedding_dim = embedding_dim
+        self.embedding_model = HashingEmbeddingModel(embedding_dim) if embedding_dim is not None else None
+        # Simulated round-trip (seconds) of each generation request, as a real LLM API would have.
+        # The *_async methods wait for it without blocking the event loop.
+        self.latency = latency
+
+    @property
+    def whitespace_insensitive(self) -> bool:
+        return self.embedding_model is not None # The scalar embedding sums every character, spaces included
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _round_trip_async(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def get_embedding(self, text: str) -> int | np.ndarray:
         """
         Generates a simple mock embedding for a given text.
         In a real scenario, this would be a high-dimensional vector.
-        LSH in the paper uses random projection; this is a simpler stand-in.
+        With embedding_dim set, the dense vector comes from the local HashingEmbeddingModel.
         """
-        # Using sum of ASCII values for simplicity to get a numeric hash input.
-        # This is a very basic way to get a number from text for hashing.
-        return sum(ord(c) for c in text)
+        if self.embedding_model is None:
+            # Using sum of ASCII values for simplicity to get a numeric hash input.
+            # This is a very basic way to get a number from text for hashing.
+            return sum(ord(c) for c in text)
+        return self.embedding_model.get_embedding(text)
+
+    def get_embeddings(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds a batch of texts. Returns a 1-D array of scalar embeddings,
+        or a (len(texts), embedding_dim) float32 matrix in dense mode.
+        """
+        if self.embedding_model is None:
+            return np.array([self.get_embedding(t) for t in texts], dtype=np.int64)
+        return self.embedding_model.get_embeddings(texts)
 
     def generate_inductive_thought(self, query: str, response: str) -> str:
         """
@@ -22,6 +242,15 @@ class MockLLMAgent:
         This is based on the paper's concept of extracting relations or key information.
         Figure 3 in the paper provides examples of prompts for this process.
         """
+        self._round_trip()
+        return self._induce_thought(query, response)
+
+    async def generate_inductive_thought_async(self, query: str, response: str) -> str:
+        """Async version of generate_inductive_thought."""
+        await self._round_trip_async()
+        return self._induce_thought(query, response)
+
+    def _induce_thought(self, query: str, response: str) -> str:
         query_lower = query.lower()
         # Example: "Do you have any book recommendations for me?" -> "I recommend "The Little Prince"."
         # Thought: "Recommend book is "The Little Prince"."
@@ -62,11 +291,28 @@ class MockLLMAgent:
         # In a real LLM, this would be a more sophisticated summarization or relation extraction.
         return f"Concluded: {response}"
 
+    def generate_inductive_thoughts(self, interactions: list[tuple[str, str]]) -> list[str]:
+        """
+        Batch version of generate_inductive_thought for (query, response) pairs.
+        A real LLM backend would send these as one batched request.
+        """
+        self._round_trip()
+        return [self._induce_thought(query, response) for query, response in interactions]
+
     def generate_response(self, query: str, recalled_thoughts: list[str]) -> str:
         """
         Simulates generating a response, potentially using recalled thoughts.
         The paper emphasizes that TiM recalls thoughts to avoid re-reasoning over raw history.
         """
+        self._round_trip()
+        return self._compose_response(query, recalled_thoughts)
+
+    async def generate_response_async(self, query: str, recalled_thoughts: list[str]) -> str:
+        """Async version of generate_response."""
+        await self._round_trip_async()
+        return self._compose_response(query, recalled_thoughts)
+
+    def _compose_response(self, query: str, recalled_thoughts: list[str]) -> str:
         if recalled_thoughts:
             # If thoughts are recalled, the response incorporates them.
             return f"Based on memory ('{'; '.join(recalled_thoughts)}'), the answer to '{query}' is: Processed Response using these thoughts."
@@ -77,96 +323,89 @@ class MockLLMAgent:
         """
         Simulates an LLM identifying counterfactual or contradictory thoughts to forget.
         This is inspired by Figure 4 in the paper.
+        All rules are checked in a single pass over the group.
         """
-        to_forget = []
+        to_forget = set()
         # Example from Figure 4: Removing a contradictory capital.
         # If "The capital of China is Beijing." and "The capital of China is Shanghai." exist,
         # the LLM might identify "Shanghai" as the one to forget if "Beijing" is more current/correct.
-        capitals_of_china = [t for t in thought_group if "capital of China is" in t]
-        if "The capital of China is Beijing." in capitals_of_china and \
-           "The capital of China is Shanghai." in capitals_of_china:
-            to_forget.append("The capital of China is Shanghai.")
-        
-        # Generic rule for demo: forget thoughts marked as "old version" or "ignore".
-        to_forget.extend([t for t in thought_group if "old version" in t.lower() or "ignore this" in t.lower()])
-        return list(set(to_forget)) # Return unique thoughts to forget.
+        capitals_of_china = set()
+        for thought in thought_group:
+            if thought in self._CHINA_CAPITAL_FACTS:
+                capitals_of_china.add(thought)
+            # Generic rule for demo: forget thoughts marked as "old version" or "ignore".
+            lowered = thought.lower()
+            if "old version" in lowered or "ignore this" in lowered:
+                to_forget.add(thought)
+        if len(capitals_of_china) == len(self._CHINA_CAPITAL_FACTS):
+            to_forget.add("The capital of China is Shanghai.")
+        return list(to_forget) # Return unique thoughts to forget.
 
     def merge_thoughts_in_group(self, thought_group: list[str]) -> list[str]:
         """
         Simulates an LLM merging similar thoughts with the same entity.
         This is inspired by Figure 5 in the paper.
         Example: "John works as an actor.", "John works as a director." -> "John works as an actor, a director."
+        One pass indexes the group by entity (attribute text -> positions, person -> positions of their
+        roles); a second pass merges in group order, so the work is linear in the group size.
         """
         current_thoughts = list(thought_group) # Work with a copy
-        final_merged_thoughts = []
-        processed_indices = set() # Keep track of thoughts already merged or added
+        attribute_positions: dict[str, collections.deque[int]] = {} # '"Book" is interesting.' -> positions
+        role_positions: dict[str, collections.deque[int]] = {} # Person -> positions of "<person> works as a ..."
+        for idx, thought in enumerate(current_thoughts):
+            if thought.endswith(" is interesting."):
+                attribute_positions.setdefault(thought, collections.deque()).append(idx)
+            if " works as a" in thought:
+                role_positions.setdefault(thought.split(" works as a", 1)[0], collections.deque()).append(idx)
 
-        i = 0
-        while i < len(current_thoughts):
-            if i in processed_indices:
-                i += 1
+        final_merged_thoughts = []
+        processed = [False] * len(current_thoughts) # Thoughts already merged or added
+        for i, thought1 in enumerate(current_thoughts):
+            if processed[i]:
                 continue
-            
-            thought1 = current_thoughts[i]
+            processed[i] = True
             merged_this_iter = False
 
             # Case 1: Merging book recommendation and its attribute (e.g., interesting)
             # "Recommend book is "The Little Prince"." + ""The Little Prince" is interesting."
             # -> "Recommend book is "The Little Prince". Moreover, "The Little Prince" is interesting."
             if thought1.startswith("Recommend book is"):
-                try:
-                    # Extract book name from the first thought.
-                    book_name_quotes = thought1.split("Recommend book is")[1].strip().replace(".","") 
-                    book_name_no_quotes = book_name_quotes.replace('"', '')
-                    
-                    for j in range(len(current_thoughts)): # Search for a matching attribute thought
-                        if j == i or j in processed_indices:
-                            continue
-                        thought2 = current_thoughts[j]
-                        if thought2 == f"\"{book_name_no_quotes}\" is interesting.":
-                            final_merged_thoughts.append(f"{thought1} Moreover, \"{book_name_no_quotes}\" is interesting.")
-                            processed_indices.add(i)
-                            processed_indices.add(j)
-                            merged_this_iter = True
-                            break
-                except IndexError:
-                    pass # Thought format not as expected, skip.
-            
+                # Extract book name from the first thought.
+                book_name_quotes = thought1.split("Recommend book is")[1].strip().replace(".","")
+                book_name_no_quotes = book_name_quotes.replace('"', '')
+                # The first matching attribute thought not merged yet
+                positions = attribute_positions.get(f"\"{book_name_no_quotes}\" is interesting.")
+                while positions and processed[positions[0]]:
+                    positions.popleft()
+                if positions:
+                    final_merged_thoughts.append(f"{thought1} Moreover, \"{book_name_no_quotes}\" is interesting.")
+                    processed[positions.popleft()] = True
+                    merged_this_iter = True
+
             # Case 2: Merging roles for the same person (e.g., John)
             # "John works as an actor." + "John works as a director." -> "John works as an actor, a director."
             if " works as a" in thought1 and not merged_this_iter:
                 entity_role_parts = thought1.split(" works as a")
                 entity = entity_role_parts[0] # e.g., "John"
                 current_roles = [entity_role_parts[1].replace(".","")] # e.g., ["actor"]
-                
-                temp_processed_indices_for_merge = {i} # Track indices for this specific merge attempt
-                
-                for j in range(i + 1, len(current_thoughts)): # Check subsequent thoughts for same entity
-                    if j in processed_indices:
-                        continue
-                    thought2 = current_thoughts[j]
-                    if thought2.startswith(entity + " works as a"):
-                        new_role = thought2.split(" works as a")[1].replace(".","")
-                        current_roles.append(new_role)
-                        temp_processed_indices_for_merge.add(j)
-                
+
+                # Subsequent thoughts for the same entity; every position is visited here only once,
+                # since they are all merged now (or were already processed).
+                positions = role_positions.pop(entity)
+                for j in positions:
+                    if j > i and not processed[j]:
+                        current_roles.append(current_thoughts[j].split(" works as a")[1].replace(".",""))
+                        processed[j] = True
+
                 if len(current_roles) > 1: # If multiple roles found, merge them
                     # Sort roles for consistent output, use set to remove duplicates before joining
                     merged_role_string = ", a ".join(sorted(list(set(current_roles))))
                     final_merged_thoughts.append(f"{entity} works as a {merged_role_string}.")
-                    processed_indices.update(temp_processed_indices_for_merge)
                     merged_this_iter = True
-            
+
             if not merged_this_iter: # If no merge happened for thought1
                 final_merged_thoughts.append(thought1)
-                processed_indices.add(i) 
-            i += 1
-        
-        # Add any thoughts that were not part of a merge and not yet added
-        for idx, thought in enumerate(current_thoughts):
-            if idx not in processed_indices:
-                final_merged_thoughts.append(thought)
-                
+
         return final_merged_thoughts
 
 
@@ -188,134 +427,2062 @@ class SimpleLSH:
         """
         return embedding % self.num_groups
 
+    def get_hash_indices(self, embeddings: np.ndarray) -> np.ndarray:
+        """Batch version of get_hash_index for a 1-D array of scalar embeddings."""
+        return np.asarray(embeddings, dtype=np.int64) % self.num_groups
+
+    def get_probe_indices(self, embedding: int, num_probes: int) -> list[int]:
+        """
+        Returns the home group followed by its nearest neighbouring groups (h+1, h-1, h+2, ...),
+        up to num_probes groups in total.
+        """
+        home = self.get_hash_index(embedding)
+        probes = [home]
+        offset = 1
+        while len(probes) < min(num_probes, self.num_groups):
+            for candidate in (home + offset, home - offset):
+                candidate %= self.num_groups
+                if candidate not in probes and len(probes) < num_probes:
+                    probes.append(candidate)
+            offset += 1
+        return probes
+
+    def resized(self, num_groups: int) -> "SimpleLSH":
+        """The same hash function with a different number of groups (used when the memory grows)."""
+        return SimpleLSH(num_groups)
+
+    def derive(self, table_idx: int) -> "SimpleLSH":
+        """SimpleLSH has no randomness, so it cannot produce independent hash tables."""
+        raise ValueError("SimpleLSH does not support multiple hash tables; use RandomProjectionLSH.")
+
+
+class RandomProjectionLSH:
+    """
+    Random-projection LSH as described in the paper: F(x) = arg max ([xR; -xR]).
+    R is a (embedding_dim, num_groups / 2) Gaussian matrix drawn from a seeded generator,
+    so the same seed always produces the same grouping. Nearby vectors point the same way
+    and therefore pick the same (signed) projection as their maximum.
+    """
+    def __init__(self, num_groups: int = 10, embedding_dim: int = 64, seed: int = 0):
+        if num_groups < 2 or num_groups % 2:
+            raise ValueError(f"num_groups must be an even number >= 2, got {num_groups}.")
+        self.num_groups = num_groups # Number of hash buckets/groups ('b' in the paper)
+        self.embedding_dim = embedding_dim
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((embedding_dim, num_groups // 2)).astype(np.float32)
+
+    def get_hash_index(self, embedding: np.ndarray) -> int:
+        """Calculates the group index for a single dense embedding."""
+        return int(self.get_hash_indices(np.asarray(embedding)[np.newaxis, :])[0])
+
+    def get_hash_indices(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Hashes a whole (n, embedding_dim) batch with one matrix multiply.
+        arg max over [xR; -xR] is the column with the largest |xR|, offset by
+        num_groups / 2 when that projection is negative.
+        """
+        projected = np.asarray(embeddings, dtype=np.float32) @ self.projection
+        best = np.argmax(np.abs(projected), axis=1)
+        negative = projected[np.arange(len(projected)), best] < 0
+        return best + negative * (self.num_groups // 2)
+
+    def get_probe_indices(self, embedding: np.ndarray, num_probes: int) -> list[int]:
+        """
+        Multi-probe LSH: returns the num_probes groups with the highest scores in [xR; -xR].
+        The first entry is always the home group from get_hash_index; the following ones are
+        the buckets the vector would fall into if it were rotated slightly.
+        """
+        projected = np.asarray(embedding, dtype=np.float32) @ self.projection
+        scores = np.concatenate([projected, -projected])
+        num_probes = min(num_probes, self.num_groups)
+        top = np.argpartition(-scores, num_probes - 1)[:num_probes]
+        return [int(i) for i in top[np.argsort(-scores[top], kind="stable")]]
+
+    def resized(self, num_groups: int) -> "RandomProjectionLSH":
+        """A hash function from the same seed with a different number of groups (used when the memory grows)."""
+        return RandomProjectionLSH(num_groups, self.embedding_dim, seed=self.seed)
+
+    def derive(self, table_idx: int) -> "RandomProjectionLSH":
+        """Creates an independent hash function (a different projection matrix) for an extra table."""
+        return RandomProjectionLSH(self.num_groups, self.embedding_dim, seed=self.seed + table_idx)
+
+
+# --- Thought Store ---
+class ThoughtStore:
+    """
+    Content-addressed storage for thought texts.
+    Every thought is kept once under a stable id derived from a hash of its text,
+    so the same text always gets the same id (across runs and processes).
+
+    Thought records are stored as a struct of arrays: each thought has a row, and the row's id
+    (the 16-byte content hash; its hex form is what logs and snapshots use), text offset and length,
+    timestamp (the insertion sequence used for recency), usage statistics (recall count and the
+    memory clock tick of the last insert or recall), table-0 group and reference count live in flat
+    NumPy columns. Memory groups and indexes refer to thoughts by row, so they are flat int32 arrays
+    too. The texts themselves are UTF-8 bytes in one shared arena instead of one Python string per
+    thought. Rows loaded from a snapshot (see MemoryLog) point into the memory-mapped snapshot
+    texts, which come first in the arena.
+    """
+    _COLUMNS = (("_digests", "V16"), ("_starts", np.int64), ("_lengths", np.int32), ("_sequence", np.int64),
+                ("_recall_counts", np.int32), ("_last_used", np.int64), ("_groups", np.int32),
+                ("_refcounts", np.int32))
+
+    def __init__(self, capacity: int = 1024):
+        self._rows: dict[bytes, int] = {} # Id digest -> row
+        self._free_rows: list[int] = [] # Rows of removed thoughts, reused by the next additions
+        self._shared: set[int] = set() # Rows that got a second reference since they were added (rare)
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self._next_row = 0
+        # Arena offsets below _base address the snapshot texts; the rest address _arena.
+        self._snapshot_texts: mmap.mmap | bytes = b""
+        self._base = 0
+        self._arena = bytearray()
+        self._dead_bytes = 0 # Arena bytes of removed thoughts, reclaimed by _compact
+
+    @staticmethod
+    def thought_id(thought_text: str) -> str:
+        """Stable content hash id for a thought text."""
+        return content_hash(thought_text)
+
+    def attach_snapshot(self, digests: np.ndarray, groups: np.ndarray, texts: mmap.mmap | bytes,
+                        offsets: np.ndarray, sequence: np.ndarray, recall_counts: np.ndarray | None = None,
+                        last_used: np.ndarray | None = None) -> np.ndarray:
+        """
+        Loads snapshot rows into an empty store without reading their texts: row i's text is
+        texts[offsets[i]:offsets[i + 1]]. An id listed several times (referenced by several groups)
+        gets one row with a matching reference count. Returns the row of every snapshot entry.
+        """
+        count = len(digests)
+        self._reserve(count)
+        self._snapshot_texts = texts
+        self._base = int(offsets[-1]) if count else 0
+        self._digests[:count] = digests
+        self._starts[:count] = offsets[:-1]
+        self._lengths[:count] = np.diff(offsets)
+        self._sequence[:count] = sequence
+        self._recall_counts[:count] = recall_counts if recall_counts is not None else 0
+        self._last_used[:count] = last_used if last_used is not None else 0
+        self._groups[:count] = groups
+        self._refcounts[:count] = 1
+        keys = digests.tolist()
+        self._rows = dict(zip(keys, range(count)))
+        self._next_row = count
+        rows = np.arange(count, dtype=np.int32)
+        if len(self._rows) < count:
+            for row, key in enumerate(keys):
+                if self._rows[key] != row:
+                    rows[row] = self._rows[key]
+                    self._refcounts[row] = 0
+                    self._refcounts[rows[row]] += 1
+                    self._shared.add(int(rows[row]))
+                    self._free_rows.append(row)
+        return rows
+
+    def _reserve(self, count: int):
+        """Grows every column (by doubling) to hold at least count rows."""
+        capacity = len(self._starts)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        for name, _ in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def row(self, t_id: str) -> int | None:
+        """The row of a stored thought (None if it is not stored)."""
+        return self._rows.get(bytes.fromhex(t_id))
+
+    def add(self, thought_text: str, t_id: str | None = None, group: int = 0, clock: int = 0) -> int:
+        """
+        Stores a thought (or adds a reference to an existing one) and returns its row.
+        Passing the already computed id avoids hashing the text again.
+        A new thought records its table-0 group and the memory clock tick of its insertion.
+        """
+        if t_id is None:
+            t_id = self.thought_id(thought_text)
+        key = bytes.fromhex(t_id)
+        row = self._rows.get(key)
+        if row is not None:
+            self._refcounts[row] += 1
+            self._shared.add(row)
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._next_row
+            self._next_row += 1
+            self._reserve(self._next_row)
+        encoded = thought_text.encode("utf-8")
+        self._digests[row] = key
+        self._starts[row] = self._base + len(self._arena)
+        self._lengths[row] = len(encoded)
+        self._sequence[row] = 0
+        self._recall_counts[row] = 0
+        self._last_used[row] = clock
+        self._groups[row] = group
+        self._refcounts[row] = 1
+        self._arena += encoded
+        self._rows[key] = row
+        return row
+
+    def remove(self, row: int):
+        """Drops one reference to a thought; the record is deleted with its last reference."""
+        self._refcounts[row] -= 1
+        if self._refcounts[row]:
+            return
+        del self._rows[self._digests[row].tobytes()]
+        self._shared.discard(row)
+        self._free_rows.append(row)
+        if self._starts[row] >= self._base:
+            self._dead_bytes += int(self._lengths[row])
+            if self._dead_bytes > max(len(self._arena) // 2, 1 << 16):
+                self._compact()
+
+    def _compact(self):
+        """Rewrites the arena without the texts of removed thoughts (amortized over the removals)."""
+        rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+        rows = rows[self._starts[rows] >= self._base]
+        rows = rows[np.argsort(self._starts[rows], kind="stable")]
+        arena = bytearray()
+        for row, start, length in zip(rows.tolist(), (self._starts[rows] - self._base).tolist(),
+                                      self._lengths[rows].tolist()):
+            self._starts[row] = self._base + len(arena)
+            arena += self._arena[start:start + length]
+        self._arena = arena
+        self._dead_bytes = 0
+
+    def shared(self, row: int) -> bool:
+        """True if the thought is (or has been) referenced by more than one group."""
+        return row in self._shared
+
+    def id_of(self, row: int) -> str:
+        return self._digests[row].tobytes().hex()
+
+    def ids(self, rows: np.ndarray | list[int]) -> list[str]:
+        """Ids of several rows, hex-encoded in one step."""
+        hexed = self._digests[rows].tobytes().hex()
+        return [hexed[start:start + 32] for start in range(0, len(hexed), 32)]
+
+    def get(self, row: int) -> str:
+        start = self._starts.item(row)
+        end = start + self._lengths.item(row)
+        if start < self._base:
+            return self._snapshot_texts[start:end].decode("utf-8")
+        return self._arena[start - self._base:end - self._base].decode("utf-8")
+
+    def get_many(self, rows: np.ndarray | list[int]) -> list[str]:
+        """Texts of several thoughts, with the column lookups done in one vectorized step."""
+        starts = self._starts[rows].tolist()
+        lengths = self._lengths[rows].tolist()
+        base, arena, snapshot_texts = self._base, self._arena, self._snapshot_texts
+        return [(arena[start - base:start - base + length] if start >= base
+                 else snapshot_texts[start:start + length]).decode("utf-8")
+                for start, length in zip(starts, lengths)]
+
+    def sequences(self, rows: np.ndarray | list[int]) -> np.ndarray:
+        """Timestamps of thoughts: their positions in the memory's insertion (recency) order."""
+        return self._sequence[rows]
+
+    def set_sequences(self, rows: np.ndarray | list[int], sequence: np.ndarray | int):
+        self._sequence[rows] = sequence
+
+    def recall_counts(self, rows: np.ndarray | list[int]) -> np.ndarray:
+        """Number of times each thought has been returned by recall."""
+        return self._recall_counts[rows]
+
+    def last_used(self, rows: np.ndarray | list[int]) -> np.ndarray:
+        """Memory clock tick at which each thought was last inserted or recalled."""
+        return self._last_used[rows]
+
+    def record_recall(self, rows: np.ndarray | list[int], clock: int = 0):
+        """Counts a recall of each (distinct) thought at the given memory clock tick."""
+        self._recall_counts[rows] += 1
+        self._last_used[rows] = clock
+
+    def set_groups(self, rows: np.ndarray | list[int], groups: np.ndarray | list[int]):
+        """Records the table-0 group each thought now lives in (e.g. after a resize moved it)."""
+        self._groups[rows] = groups
+
+    def sample(self, count: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Up to count thoughts drawn uniformly at random (free rows drawn are skipped), with their
+        table-0 groups, last-used ticks and recall counts: the candidates for a sampled eviction.
+        """
+        rows = rng.integers(0, max(self._next_row, 1), count)
+        rows = rows[self._refcounts[rows] > 0]
+        return rows, self._groups[rows], self._last_used[rows], self._recall_counts[rows]
+
+    def __contains__(self, t_id: str) -> bool:
+        return bytes.fromhex(t_id) in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+# --- Persistence ---
+class MemoryLog:
+    """
+    Persists a MemoryCache as compacted snapshots plus an append-only operation log.
+
+    Directory layout (N is the current generation, named in the CURRENT file):
+      snapshot-N/   meta.json, ids.npy, groups.npy, extra_groups.npy, sequence.npy, recall_counts.npy,
+                    last_used.npy, offsets.npy, texts.bin (UTF-8 text arena), embeddings.npy
+      oplog-N.log   insert/forget/merge/evict/resize operations since snapshot-N, one per line as
+                    "<crc32 hex> <json>", so a torn or corrupt tail is detected and dropped.
+    Snapshot rows are sorted by (group, sequence); the snapshot records the group count, so a
+    memory that has grown (see MemoryCache.start_resize) reopens with its current size. Texts and embeddings are memory-mapped on
+    load and only read when a thought is actually used, so large memories open quickly.
+    A new snapshot is written to a temporary directory and fsynced (files, then directories) before
+    CURRENT is atomically replaced; a crash or power loss at any point leaves the previous generation
+    intact, and the leftovers of the interrupted snapshot are deleted on the next recover.
+    """
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, directory: str, snapshot_every: int = 10_000, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every # Operations logged before an automatic snapshot (0 disables)
+        self.fsync = fsync # fsync every operation (durable against power loss, much slower)
+        os.makedirs(directory, exist_ok=True)
+        self.generation = self._read_current()
+        self.ops_since_snapshot = 0
+        self._log_file = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _snapshot_dir(self, generation: int) -> str:
+        return self._path(f"snapshot-{generation}")
+
+    def _log_path(self, generation: int) -> str:
+        return self._path(f"oplog-{generation}.log")
+
+    def _read_current(self) -> int:
+        try:
+            with open(self._path("CURRENT")) as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+
+    def _remove_stale_files(self):
+        """Deletes leftovers of interrupted snapshots and of generations that are no longer current."""
+        current = {f"snapshot-{self.generation}", f"oplog-{self.generation}.log", "CURRENT"}
+        for name in os.listdir(self.directory):
+            if name in current or not name.startswith(("snapshot-", "oplog-", "CURRENT.")):
+                continue
+            path = self._path(name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def recover(self, cache: "MemoryCache") -> int:
+        """Loads the current snapshot into an empty cache and replays the log. Returns the number of ops replayed."""
+        self._remove_stale_files()
+        if os.path.isdir(self._snapshot_dir(self.generation)):
+            self._load_snapshot(cache)
+        replayed = self._replay(cache)
+        self._log_file = open(self._log_path(self.generation), "ab")
+        self.ops_since_snapshot = replayed
+        return replayed
+
+    def _replay(self, cache: "MemoryCache") -> int:
+        """Applies every intact log record; a torn or corrupt tail (from a crash mid-write) is truncated."""
+        path = self._log_path(self.generation)
+        if not os.path.exists(path):
+            return 0
+        replayed = 0
+        good_offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                record = self._decode_record(line)
+                if record is None:
+                    break # Everything from the first bad record on was never fully written
+                cache._replay_record(record)
+                good_offset += len(line)
+                replayed += 1
+        if good_offset != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+        return replayed
+
+    @staticmethod
+    def _decode_record(line: bytes) -> dict | None:
+        if not line.endswith(b"\n"):
+            return None
+        checksum, _, payload = line[:-1].partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def append(self, record: dict):
+        """Appends one operation to the log."""
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._log_file.write(b"%08x %s\n" % (zlib.crc32(payload), payload))
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+        self.ops_since_snapshot += 1
+
+    def maybe_snapshot(self, cache: "MemoryCache"):
+        """Compacts the log into a new snapshot once snapshot_every operations have been logged."""
+        if self.snapshot_every and self.ops_since_snapshot >= self.snapshot_every:
+            self.snapshot(cache)
+
+    def snapshot(self, cache: "MemoryCache"):
+        """Writes the whole cache as generation N+1, switches to it and deletes generation N."""
+        new_generation = self.generation + 1
+        final_dir = self._snapshot_dir(new_generation)
+        tmp_dir = final_dir + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        self._write_snapshot(cache, tmp_dir)
+        for name in os.listdir(tmp_dir):
+            self._fsync_path(os.path.join(tmp_dir, name))
+        self._fsync_path(tmp_dir)
+        os.replace(tmp_dir, final_dir)
+        open(self._log_path(new_generation), "wb").close()
+        self._fsync_path(self.directory) # The renamed snapshot and the new log must exist before CURRENT names them
+        self._write_atomic("CURRENT", str(new_generation))
+
+        self._log_file.close()
+        old_generation, self.generation = self.generation, new_generation
+        self._log_file = open(self._log_path(new_generation), "ab")
+        self.ops_since_snapshot = 0
+        if os.path.isdir(self._snapshot_dir(old_generation)):
+            shutil.rmtree(self._snapshot_dir(old_generation))
+        if os.path.exists(self._log_path(old_generation)):
+            os.remove(self._log_path(old_generation))
+
+    def _write_atomic(self, name: str, content: str):
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(name))
+        self._fsync_path(self.directory)
+
+    @staticmethod
+    def _fsync_path(path: str):
+        """fsyncs a file, or a directory (which makes the creation and renaming of its entries durable)."""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_snapshot(self, cache: "MemoryCache", snapshot_dir: str):
+        cache.finish_resize()
+        group_rows = [cache._sorted_group(g_idx) for g_idx in sorted(cache.memory)]
+        rows = np.concatenate(group_rows) if group_rows else np.empty(0, dtype=np.int32)
+        groups = np.repeat(np.array(sorted(cache.memory), dtype=np.int32), [len(group) for group in group_rows])
+        extra_groups = np.zeros((len(rows), len(cache.tables) - 1), dtype=np.int32)
+        for table_idx, table in enumerate(cache.tables[1:]):
+            group_of = np.zeros(cache.store._next_row, dtype=np.int32)
+            for g_idx, group in table.groups.items():
+                group_of[group.rows] = g_idx
+            extra_groups[:, table_idx] = group_of[rows]
+
+        store = cache.store
+        hex_ids = np.frombuffer(store._digests[rows].tobytes().hex().encode("ascii"), dtype="S32")
+        np.save(os.path.join(snapshot_dir, "ids.npy"), hex_ids)
+        np.save(os.path.join(snapshot_dir, "groups.npy"), groups)
+        np.save(os.path.join(snapshot_dir, "extra_groups.npy"), extra_groups)
+        np.save(os.path.join(snapshot_dir, "sequence.npy"), store.sequences(rows))
+        np.save(os.path.join(snapshot_dir, "recall_counts.npy"), store.recall_counts(rows))
+        np.save(os.path.join(snapshot_dir, "last_used.npy"), store.last_used(rows))
+
+        # Texts and embeddings are streamed group by group so the snapshot never needs them all in memory.
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        embeddings = None
+        with open(os.path.join(snapshot_dir, "texts.bin"), "wb") as texts_file:
+            start = 0
+            for g_idx in sorted(cache.memory):
+                group = cache.memory[g_idx]
+                if not group:
+                    continue
+                for position, thought_text in enumerate(store.get_many(group.rows), start=start):
+                    encoded = thought_text.encode("utf-8")
+                    texts_file.write(encoded)
+                    offsets[position + 1] = offsets[position] + len(encoded)
+                group_embeddings = cache.tables[0].vectors[g_idx].rows
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(
+                        os.path.join(snapshot_dir, "embeddings.npy"), mode="w+",
+                        dtype=group_embeddings.dtype, shape=(len(rows),) + group_embeddings.shape[1:])
+                embeddings[start:start + len(group)] = group_embeddings
+                start += len(group)
+        if embeddings is not None:
+            embeddings.flush()
+            del embeddings
+        np.save(os.path.join(snapshot_dir, "offsets.npy"), offsets)
+        with open(os.path.join(snapshot_dir, "meta.json"), "w") as f:
+            json.dump({"version": self.SNAPSHOT_VERSION, "count": len(rows), "num_groups": cache.lsh.num_groups,
+                       "num_tables": len(cache.tables), "next_sequence": cache._next_sequence,
+                       "clock": cache._clock}, f)
+
+    def _load_snapshot(self, cache: "MemoryCache"):
+        snapshot_dir = self._snapshot_dir(self.generation)
+        with open(os.path.join(snapshot_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["num_tables"] != len(cache.tables):
+            raise ValueError(f"Snapshot in {snapshot_dir} was written with {meta['num_tables']} table(s); "
+                             f"the cache has {len(cache.tables)}.")
+        hex_ids = np.load(os.path.join(snapshot_dir, "ids.npy"))
+        digests = np.frombuffer(bytes.fromhex(hex_ids.tobytes().decode("ascii")), dtype="V16")
+        groups = np.load(os.path.join(snapshot_dir, "groups.npy"))
+        extra_groups = np.load(os.path.join(snapshot_dir, "extra_groups.npy"))
+        sequence = np.load(os.path.join(snapshot_dir, "sequence.npy"))
+        offsets = np.load(os.path.join(snapshot_dir, "offsets.npy"), mmap_mode="r")
+        embeddings_path = os.path.join(snapshot_dir, "embeddings.npy")
+        embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else np.empty(0)
+        recall_counts_path = os.path.join(snapshot_dir, "recall_counts.npy")
+        recall_counts = np.load(recall_counts_path) if os.path.exists(recall_counts_path) else None
+        last_used_path = os.path.join(snapshot_dir, "last_used.npy")
+        last_used = np.load(last_used_path) if os.path.exists(last_used_path) else None
+        texts: mmap.mmap | bytes = b""
+        if offsets[-1] > 0:
+            with open(os.path.join(snapshot_dir, "texts.bin"), "rb") as f:
+                texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        rows = cache.store.attach_snapshot(digests, groups, texts, offsets, sequence, recall_counts, last_used)
+        cache._load_rows(rows, groups, extra_groups, sequence, meta["next_sequence"], meta["num_groups"], embeddings)
+        cache._clock = meta.get("clock", 0)
+
+    def close(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+
+# --- Metrics and Tracing ---
+# Verbose tracing goes through this logger at INFO level. It is silent unless enabled (see enable_tracing),
+# and messages use %-style arguments, so nothing is formatted while it is off.
+logger = logging.getLogger("tim")
+
+
+def enable_tracing(stream=None):
+    """Prints every trace message (the demo's step-by-step output) to stream (default: stdout)."""
+    if not any(getattr(handler, "_tim_trace", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream if stream is not None else sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler._tim_trace = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _no_trace(*args, **kwargs):
+    """Stands in for logger.info when an operation runs quietly (e.g. in the background organizer)."""
+
+
+class Histogram:
+    """Counts observations into fixed buckets (Prometheus style: `le` upper bounds plus +Inf)."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Per bucket (not cumulative); the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if it is the +Inf bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return bound
+        return math.inf
+
+
+class Metrics:
+    """
+    Counters and histograms for the hot paths, exportable in the Prometheus text format.
+    Timings are in seconds; size histograms count thoughts. Safe to share between threads and shards.
+    """
+    TIME_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    SIZE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+    # Metric name -> help text. Names ending in _seconds are timings, _total are counters.
+    DESCRIPTIONS = {
+        "tim_stage1_seconds": "Stage 1 of a query: recall and response generation.",
+        "tim_stage2_seconds": "Stage 2 of a query: post-think and memory update.",
+        "tim_hash_seconds": "Embedding and LSH hashing of a thought, batch or query.",
+        "tim_recall_seconds": "Whole recall_thoughts call.",
+        "tim_rank_seconds": "Stage-2 ranking of the recall candidates.",
+        "tim_insert_seconds": "Whole insert_thought call.",
+        "tim_insert_batch_seconds": "Whole insert_thoughts call.",
+        "tim_forget_seconds": "Identifying the thoughts of a group to forget.",
+        "tim_merge_seconds": "Merging the thoughts of a group.",
+        "tim_recall_candidates": "Thoughts in the groups probed by a recall (before deduplication).",
+        "tim_insert_group_size": "Size of the group a thought was inserted into.",
+        "tim_inserts_total": "Thoughts inserted.",
+        "tim_insert_duplicates_total": "Inserts skipped because the thought was already stored.",
+        "tim_recalls_total": "Recall calls.",
+        "tim_recall_hits_total": "Recalls that found at least one thought similar to the query (a shared word "
+                                 "or a positive cosine).",
+        "tim_recall_cache_hits_total": "Recalls answered from the recall cache.",
+        "tim_recall_cache_misses_total": "Recalls that had to be ranked (not cached, or cached but stale).",
+        "tim_forgotten_total": "Thoughts removed by forget.",
+        "tim_organized_total": "Group organizations applied.",
+        "tim_organize_conflicts_total": "Group organizations dropped because the group changed meanwhile.",
+        "tim_resizes_total": "Resizes of the memory table.",
+        "tim_evictions_total": "Thoughts evicted to keep the memory within its capacity limits.",
+    }
+
+    def __init__(self):
+        self.counters: dict[str, float] = collections.defaultdict(float)
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = TIME_BUCKETS):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def since(self, name: str, start: float):
+        """Observes the time elapsed since start (a time.perf_counter() value)."""
+        self.observe(name, time.perf_counter() - start)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Counters, plus count/mean/p50/p99 of every histogram."""
+        with self._lock:
+            summary = {"counters": dict(self.counters)}
+            for name, histogram in self.histograms.items():
+                summary[name] = {"count": histogram.count,
+                                 "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                                 "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99)}
+        return summary
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self.counters):
+                lines += self._header(name, "counter")
+                lines.append(f"{name} {self.counters[name]:g}")
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                lines += self._header(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(f'{name}_bucket{{le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum {histogram.sum:g}")
+                lines.append(f"{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str, kind: str) -> list[str]:
+        description = self.DESCRIPTIONS.get(name)
+        return ([f"# HELP {name} {description}"] if description else []) + [f"# TYPE {name} {kind}"]
+
+
+# --- Eviction Policies ---
+class EvictionPolicy(Protocol):
+    """
+    How a capacity-bounded MemoryCache picks the thought to evict. Given the usage statistics of
+    a few candidate thoughts, returns one priority per candidate; the lowest one is evicted.
+    last_used is the memory clock tick (one tick per insert and per recall) of each thought's
+    last insert or recall, recall_counts how often it was recalled, and clock the current tick.
+    """
+    def priorities(self, last_used: np.ndarray, recall_counts: np.ndarray, clock: int) -> np.ndarray: ...
+
+
+class LRUEviction:
+    """Evicts the least recently used thought: the one recalled (or, if never recalled, inserted) longest ago."""
+    def priorities(self, last_used: np.ndarray, recall_counts: np.ndarray, clock: int) -> np.ndarray:
+        return last_used
+
+
+class LFUEviction:
+    """Evicts the least often recalled thought; among equally recalled ones, the least recently used."""
+    def priorities(self, last_used: np.ndarray, recall_counts: np.ndarray, clock: int) -> np.ndarray:
+        return recall_counts + last_used / (clock + 1) # The recency tie-breaker stays below 1
+
+
+class AgeDecayEviction:
+    """
+    Evicts the thought with the lowest decayed usage: its recall count (plus one for the insert),
+    halved for every half_life ticks since it was last used. Unlike LFU, thoughts that were popular
+    long ago eventually make room for new ones.
+    """
+    def __init__(self, half_life: float = 10_000):
+        if half_life <= 0:
+            raise ValueError(f"half_life must be positive, got {half_life}.")
+        self.half_life = half_life
+
+    def priorities(self, last_used: np.ndarray, recall_counts: np.ndarray, clock: int) -> np.ndarray:
+        return (recall_counts + 1) * np.exp2((last_used - clock) / self.half_life)
+
+
+# Policies selectable by name (MemoryCache(eviction=...)); any EvictionPolicy object works too.
+EVICTION_POLICIES = {"lru": LRUEviction, "lfu": LFUEviction, "age": AgeDecayEviction}
+
 
 # --- Memory Cache ---
+def _synchronized(method):
+    """Runs a MemoryCache method while holding the cache lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _embed_new_thoughts(embedder: EmbeddingModel, records: list[dict]) -> dict[str, np.ndarray]:
+    """Embeddings of the texts a planned merge created, by id (empty if nothing was merged)."""
+    new_texts = next((record["texts"] for record in records if record["op"] == "merge"), {})
+    if not new_texts:
+        return {}
+    return dict(zip(new_texts, embedder.get_embeddings(list(new_texts.values()))))
+
+
+def _plan_organization(llm_agent: MockLLMAgent, group_idx: int, original_ids: list[str],
+                       original_thoughts: list[str], mode: str, say=_no_trace, metrics: Metrics | None = None,
+                       embedder: EmbeddingModel | None = None):
+    """
+    Runs the LLM's forget and/or merge pass over a copy of a group, without touching the cache.
+    Returns the group's final ids and texts, the log records describing the change, the number
+    of thoughts forgotten and, with an embedder, the embeddings of the merged texts (so applying
+    the plan needs no embedding calls). A plain function, so process-pool workers can run it too.
+    """
+    say("\n  🧠 MEMORY (Org): Organizing group %d. Original thoughts: %s", group_idx, original_thoughts)
+
+    current_ids = original_ids
+    current_group_thoughts = original_thoughts
+    records = [] # Log records, written once the result is applied
+    num_forgotten = 0
+
+    # "Forget, i.e., remove unnecessary thoughts from the memory"
+    if mode in ["forget", "all"]:
+        start = time.perf_counter()
+        thoughts_to_forget = llm_agent.identify_thoughts_to_forget(current_group_thoughts)
+        if metrics is not None:
+            metrics.since("tim_forget_seconds", start)
+        if thoughts_to_forget:
+            say("  🧠 MEMORY (Forget): Identified to forget: %s", thoughts_to_forget)
+            forget_ids = {content_hash(t) for t in thoughts_to_forget}
+            kept = [(t_id, t) for t_id, t in zip(current_ids, current_group_thoughts) if t_id not in forget_ids]
+            current_ids = [t_id for t_id, _ in kept]
+            current_group_thoughts = [t for _, t in kept]
+            if len(kept) < len(original_ids):
+                num_forgotten = len(original_ids) - len(kept)
+                records.append({"op": "forget", "group": group_idx, "ids": sorted(forget_ids)})
+        else:
+            say("  🧠 MEMORY (Forget): No thoughts identified for forgetting in this group.")
+
+    # "Merge, i.e., merge similar thoughts in the memory"
+    if mode in ["merge", "all"]:
+        if current_group_thoughts: # Ensure there are thoughts left after potential forgetting
+            start = time.perf_counter()
+            # A merge may produce a text the group already holds; a group keeps each thought once.
+            merged_group_thoughts = list(dict.fromkeys(llm_agent.merge_thoughts_in_group(current_group_thoughts)))
+            if metrics is not None:
+                metrics.since("tim_merge_seconds", start)
+            if merged_group_thoughts != current_group_thoughts: # Check if merge actually changed anything
+                say("  🧠 MEMORY (Merge): Merged. New group state: %s", merged_group_thoughts)
+                pre_merge_ids = set(current_ids)
+                current_group_thoughts = merged_group_thoughts
+                current_ids = [content_hash(t) for t in merged_group_thoughts]
+                new_texts = {t_id: t for t_id, t in zip(current_ids, current_group_thoughts)
+                             if t_id not in pre_merge_ids}
+                records.append({"op": "merge", "group": group_idx, "ids": current_ids, "texts": new_texts})
+            else:
+                say("  🧠 MEMORY (Merge): No effective merge operations performed on remaining thoughts.")
+        else:
+            say("  🧠 MEMORY (Merge): Group empty after forgetting, skipping merge.")
+
+    embeddings = _embed_new_thoughts(embedder, records) if embedder is not None else {}
+    return current_ids, current_group_thoughts, records, num_forgotten, embeddings
+
+
+# The agent and embedder of a process-pool worker of MemoryCache.organize_all_groups (sent once, at worker start).
+_worker_agent: MockLLMAgent | None = None
+_worker_embedder: EmbeddingModel | None = None
+
+
+def _init_organize_worker(llm_agent: MockLLMAgent, embedder: EmbeddingModel):
+    global _worker_agent, _worker_embedder
+    _worker_agent = llm_agent
+    _worker_embedder = embedder
+
+
+def _organize_batch(batch: list[tuple[int, list[str]]], mode: str) -> list[tuple[int, tuple | None]]:
+    """
+    Worker side of organize_all_groups: plans the organization of a batch of (group, texts).
+    Ids are recomputed from the texts rather than shipped, and merged texts are embedded here,
+    so applying a plan in the parent only updates the memory. Unchanged groups come back as None.
+    """
+    results = []
+    for group_idx, thoughts in batch:
+        ids = [content_hash(t) for t in thoughts]
+        plan = _plan_organization(_worker_agent, group_idx, ids, thoughts, mode, embedder=_worker_embedder)
+        results.append((group_idx, plan if plan[0] != ids else None))
+    return results
+
+
+class _GroupMatrix:
+    """
+    One array per group, aligned with the group: its thoughts' store rows or their embeddings (row i
+    belongs to the group's i-th thought). Spare rows are kept at the end (grown by a quarter, like a
+    list) so appends are amortized O(1).
+    The array may be a read-only view of a snapshot; it is copied on the first change.
+    """
+    __slots__ = ("data", "size")
+
+    def __init__(self, rows: np.ndarray | None = None):
+        self.data = rows
+        self.size = 0 if rows is None else len(rows)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self.data[:self.size] if self.data is not None else np.empty(0)
+
+    def extend(self, embeddings: np.ndarray):
+        count = len(embeddings)
+        if self.data is None:
+            self.data = np.empty((max(count, 4),) + embeddings.shape[1:], dtype=embeddings.dtype)
+        elif self.size + count > len(self.data) or not self.data.flags.writeable:
+            capacity = max(len(self.data) + len(self.data) // 4 + 4, self.size + count)
+            grown = np.empty((capacity,) + self.data.shape[1:], dtype=self.data.dtype)
+            grown[:self.size] = self.rows
+            self.data = grown
+        self.data[self.size:self.size + count] = embeddings
+        self.size += count
+
+    def append(self, embedding):
+        self.extend(np.asarray(embedding)[np.newaxis])
+
+    def truncate(self, size: int):
+        self.size = size
+
+    def swap_remove(self, row: int):
+        """Removes a row in O(1) by moving the last row into its place (the row order changes)."""
+        last = self.size - 1
+        if row != last:
+            if not self.data.flags.writeable:
+                self.data = self.rows.copy()
+            self.data[row] = self.data[last]
+        self.size = last
+
+    def replace(self, rows: np.ndarray):
+        self.data = rows
+        self.size = len(rows)
+
+
+class _Postings:
+    """
+    Keyword index of one group: for each recall-token hash, the rows of the group's thoughts that
+    contain the token. Built in one step as CSR arrays (sorted token hashes, each with an ascending
+    slice of rows); thoughts added later go to a small dict of pending postings, and removed ones
+    are tombstoned in place (found by binary search). Both are folded into new CSR arrays once they
+    reach a quarter of the index, so maintenance is amortized O(tokens * log) per thought and a
+    query only reads the postings of its own tokens.
+    """
+    __slots__ = ("keys", "starts", "rows", "alive", "pending", "num_pending", "num_dead")
+
+    def __init__(self, rows: np.ndarray, hashes: list[list[int]]):
+        self.pending: dict[int, set[int]] = {}
+        self.num_pending = 0
+        counts = [len(row_hashes) for row_hashes in hashes]
+        self._build(np.fromiter(itertools.chain.from_iterable(hashes), dtype=np.int64, count=sum(counts)),
+                    np.repeat(np.asarray(rows, dtype=np.int32), counts))
+
+    def _build(self, keys: np.ndarray, rows: np.ndarray):
+        order = np.lexsort((rows, keys))
+        keys, self.rows = keys[order], rows[order]
+        firsts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else np.empty(0, int)
+        self.keys = keys[firsts]
+        self.starts = np.append(firsts, len(keys))
+        self.alive = np.ones(len(keys), dtype=bool)
+        self.num_dead = 0
+
+    def _compact(self):
+        """Rebuilds the CSR arrays without the tombstones and with the pending postings."""
+        keys = np.repeat(self.keys, np.diff(self.starts))[self.alive]
+        pending_keys = [key for key, rows in self.pending.items() for _ in rows]
+        pending_rows = [row for rows in self.pending.values() for row in rows]
+        self.pending.clear()
+        self.num_pending = 0
+        self._build(np.concatenate((keys, np.array(pending_keys, dtype=np.int64))),
+                    np.concatenate((self.rows[self.alive], np.array(pending_rows, dtype=np.int32))))
+
+    def _slice(self, key: int) -> tuple[int, int]:
+        index = int(np.searchsorted(self.keys, key))
+        if index < len(self.keys) and self.keys.item(index) == key:
+            return self.starts.item(index), self.starts.item(index + 1)
+        return 0, 0
+
+    def add(self, row: int, hashes: list[int]):
+        for key in hashes:
+            self.pending.setdefault(key, set()).add(row)
+        self.num_pending += len(hashes)
+        if self.num_pending > max(len(self.rows) // 4, 256):
+            self._compact()
+
+    def remove(self, row: int, hashes: list[int]):
+        for key in hashes:
+            pending = self.pending.get(key)
+            if pending is not None and row in pending:
+                pending.discard(row)
+                self.num_pending -= 1
+                if not pending:
+                    del self.pending[key]
+                continue
+            start, end = self._slice(key)
+            entry = start + int(np.searchsorted(self.rows[start:end], row))
+            if entry < end and self.rows.item(entry) == row and self.alive[entry]:
+                self.alive[entry] = False
+                self.num_dead += 1
+        if self.num_dead > max(len(self.rows) // 4, 256):
+            self._compact()
+
+    def scores(self, hashes: list[int]) -> tuple[np.ndarray, np.ndarray]:
+        """The rows containing at least one of the tokens, with the number of tokens each contains."""
+        matches = []
+        for key in hashes:
+            start, end = self._slice(key)
+            if end > start:
+                rows = self.rows[start:end][self.alive[start:end]]
+                if len(rows):
+                    matches.append(rows)
+            pending = self.pending.get(key)
+            if pending:
+                matches.append(np.fromiter(pending, dtype=np.int32, count=len(pending)))
+        if not matches:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        rows = np.concatenate(matches)
+        if len(matches) == 1:
+            return rows, np.ones(len(rows), dtype=np.int64)
+        rows.sort()
+        firsts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+        return rows[firsts], np.diff(np.append(firsts, len(rows)))
+
+
+class _HashTable:
+    """
+    One LSH hash table: its hash function, its groups of thoughts (store rows), the embeddings of
+    each group (aligned with the rows), a keyword index per group, the position of each row in its
+    group, the groups whose rows are out of recency order and a change counter per group.
+    """
+    __slots__ = ("lsh", "groups", "vectors", "postings", "positions", "unsorted", "versions")
+
+    def __init__(self, lsh: SimpleLSH | RandomProjectionLSH):
+        self.lsh = lsh
+        self.groups: dict[int, _GroupMatrix] = {i: _GroupMatrix(np.empty(0, dtype=np.int32))
+                                                for i in range(lsh.num_groups)}
+        self.vectors: dict[int, _GroupMatrix] = {i: _GroupMatrix() for i in range(lsh.num_groups)}
+        # Keyword index per group, built the first time the group is searched by keyword.
+        self.postings: dict[int, _Postings] = {}
+        # Store row -> its index in its group, so a thought is found in O(1). Entries of rows that left
+        # the table are stale rather than cleared; a position is only trusted if the group holds the row there.
+        self.positions = np.zeros(0, dtype=np.int32)
+        # Groups not in insertion order (filled by a resize, or after an eviction or organization).
+        self.unsorted: set[int] = set()
+        self.versions: collections.Counter[int] = collections.Counter()
+
+    def locate(self, rows: np.ndarray, start: int = 0):
+        """Records that rows are at positions start, start + 1, ... of their group."""
+        if not len(rows):
+            return
+        needed = int(rows.max()) + 1
+        if needed > len(self.positions):
+            grown = np.zeros(max(needed, 2 * len(self.positions)), dtype=np.int32)
+            grown[:len(self.positions)] = self.positions
+            self.positions = grown
+        self.positions[rows] = np.arange(start, start + len(rows), dtype=np.int32)
+
+    def position(self, g_idx: int, row: int) -> int | None:
+        """Position of a row in group g_idx according to the tracked positions (None if not there)."""
+        if row >= len(self.positions):
+            return None
+        position = self.positions.item(row)
+        group = self.groups[g_idx]
+        return position if position < len(group) and group.data.item(position) == row else None
+
+
+class RecallCache:
+    """
+    Bounded LRU cache of recall results keyed by (query, top_k); MemoryCache collapses the
+    whitespace of queries first when its embedder ignores whitespace.
+    MemoryCache tags each entry with the version of every group it was ranked from (and the
+    table generation), so a change to any of those groups makes it stale; stale entries are
+    dropped on lookup and never served.
+    """
+    def __init__(self, max_size: int = 10_000):
+        if max_size < 0:
+            raise ValueError(f"max_size must be >= 0, got {max_size}.")
+        self.max_size = max_size
+        # key -> (generation, ((table_idx, group_idx, version), ...), ranked rows, any keyword/cosine match)
+        self.entries: collections.OrderedDict[tuple[str, int], tuple] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0 # Misses that found an entry invalidated by a change to one of its groups
+
+    def get(self, key: tuple[str, int]) -> tuple | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple[str, int], entry: tuple):
+        if not self.max_size:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False) # Evict the least recently used entry
+
+    def discard(self, key: tuple[str, int]):
+        self.entries.pop(key, None)
+
+    def stats(self) -> dict[str, float]:
+        """Hit/miss counters and current size of the cache."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "stale": self.stale, "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.stale = 0
+
+
 class MemoryCache:
     """
     Manages the storage and organization of inductive thoughts.
     It uses a hash table structure (Python dictionary) where keys are hash indices (from LSH)
-    and values are lists of thoughts belonging to that group.
+    and values are the thoughts belonging to that group, as an int32 array of ThoughtStore rows.
     This aligns with M in the paper: "a continually growing hash table of key-value pairs".
+    When the average group size exceeds max_load_factor, the number of groups is doubled and
+    thoughts are moved to the new table a few at a time on each insert/recall.
+    Each group also keeps its thoughts' embeddings in one contiguous matrix, so stage 2 can score
+    a whole group with one vectorized cosine computation (similarity="cosine") instead of the
+    default keyword overlap.
+    With capacity and/or group_capacity set, the memory stops growing: each insert that goes over
+    a limit evicts a thought chosen by the eviction policy (see EvictionPolicy) among a few sampled
+    candidates, so an eviction costs O(1) however large the memory is.
     """
-    def __init__(self, lsh_instance: SimpleLSH, llm_agent: MockLLMAgent):
-        # Initialize memory as a dictionary of lists, one list per LSH group.
-        self.memory: dict[int, list[str]] = {i: [] for i in range(lsh_instance.num_groups)}
+    EVICTION_SAMPLES = 16 # Candidates compared per eviction (more: closer to the exact policy, but slower)
+    PARALLEL_MIN_THOUGHTS = 100_000 # Smaller memories are organized serially: starting worker processes costs more
+
+    def __init__(self, lsh_instance: SimpleLSH | RandomProjectionLSH, llm_agent: MockLLMAgent,
+                 num_tables: int = 1, num_probes: int = 1, embedder: EmbeddingModel | None = None,
+                 log: MemoryLog | None = None, max_load_factor: float | None = None, rehash_step: int = 16,
+                 metrics: Metrics | None = None, similarity: str = "keyword", recall_cache_size: int = 10_000,
+                 capacity: int | None = None, group_capacity: int | None = None,
+                 eviction: str | EvictionPolicy = "lru"):
+        self.store = ThoughtStore()
+        self.lsh = lsh_instance
+        self.llm_agent = llm_agent # LLM agent is used for thought manipulation
+        # All embedding lookups go through the embedder; by default the agent's embeddings behind an LRU cache.
+        self.embedder = embedder if embedder is not None else CachedEmbeddingProvider(llm_agent)
+        self.metrics = metrics if metrics is not None else Metrics()
+        if num_tables < 1 or num_probes < 1:
+            raise ValueError("num_tables and num_probes must both be at least 1.")
+        if rehash_step < 1:
+            raise ValueError("rehash_step must be at least 1.")
+        if similarity not in ("keyword", "cosine"):
+            raise ValueError(f"similarity must be 'keyword' or 'cosine', got {similarity!r}.")
+        if (capacity is not None and capacity < 1) or (group_capacity is not None and group_capacity < 1):
+            raise ValueError("capacity and group_capacity must be at least 1 (or None for no limit).")
+        if isinstance(eviction, str):
+            if eviction not in EVICTION_POLICIES:
+                raise ValueError(f"eviction must be one of {sorted(EVICTION_POLICIES)} or an EvictionPolicy, "
+                                 f"got {eviction!r}.")
+            eviction = EVICTION_POLICIES[eviction]()
+        self.num_tables = num_tables # L independent hash tables consulted on recall
+        self.num_probes = num_probes # Groups probed per table (home group + nearest neighbours)
+        self.max_load_factor = max_load_factor # Average thoughts per group that triggers a resize (None: never)
+        self.rehash_step = rehash_step # Thoughts (per table) migrated per insert/recall while resizing
+        self.similarity = similarity # Stage-2 score: keyword overlap or embedding cosine
+        # Results of repeated recalls, served until one of the groups they were ranked from changes.
+        self.recall_cache = RecallCache(recall_cache_size)
+        self.capacity = capacity # Most thoughts kept in the whole memory (None: unbounded)
+        self.group_capacity = group_capacity # Most thoughts kept in one group of self.memory (None: unbounded)
+        self.eviction = eviction
+        self._eviction_rng = np.random.default_rng(0)
+        # Guards all reads and writes; organization only holds it to snapshot and to apply a group.
+        self._lock = threading.RLock()
+        self._generation = 0 # Incremented whenever the tables are rebuilt (e.g. by a resize)
+        self._build_tables(lsh_instance)
+        # While resizing, the previous tables stay live until every old group has been migrated.
+        self._old_tables: list[_HashTable] | None = None
+        self._rehash_cursor = 0 # Old groups below the cursor have been fully migrated
+        # Next insertion sequence number; a thought's sequence (kept in the store) is the recency tie-breaker on recall.
+        self._next_sequence = 0
+        # Memory clock for the usage statistics the eviction policies read: one tick per insert and per recall.
+        self._clock = 0
+        # Optional on-disk persistence: recover existing memory, then log every change.
+        self.log = log
+        if log is not None:
+            log.recover(self)
+
+    def _build_tables(self, lsh_instance: SimpleLSH | RandomProjectionLSH):
+        """Creates empty tables for an LSH function (plus derived functions for the extra tables)."""
         self.lsh = lsh_instance
-        self.llm_agent = llm_agent # LLM agent is used for embedding and thought manipulation
+        self._generation += 1
+        # Table 0 is self.memory, the table that organization and display work on.
+        # Extra tables only index the same thought ids under independent hash functions to improve recall.
+        self.tables = [_HashTable(lsh_instance)]
+        self.tables.extend(_HashTable(lsh_instance.derive(table_idx)) for table_idx in range(1, self.num_tables))
+        # Initialize memory as a dictionary of groups, one array of thought rows per LSH group.
+        self.memory: dict[int, _GroupMatrix] = self.tables[0].groups
+        # Groups of self.memory not in insertion order; sorted when next read.
+        self._unsorted_groups: set[int] = self.tables[0].unsorted
+        # Groups changed since they were last organized (an insertion-ordered set), and a change
+        # counter per group that lets organization and the recall cache detect changes.
+        self._dirty_groups: dict[int, None] = {}
+        self._group_versions: collections.Counter[int] = self.tables[0].versions
 
-    def _get_hash_for_thought(self, thought_text: str) -> int:
-        """Helper to get LSH group index for a thought."""
-        embedding = self.llm_agent.get_embedding(thought_text)
-        return self.lsh.get_hash_index(embedding)
+    @staticmethod
+    def _recall_tokens(text: str) -> set[str]:
+        """Tokens used by the stage-2 keyword-overlap score."""
+        return set(text.lower().split())
+
+    @classmethod
+    def _token_hashes(cls, text: str) -> list[int]:
+        """
+        Hashes of a text's distinct recall tokens, the keys of the keyword index.
+        hash() only has to agree within the process: the index is never persisted.
+        """
+        return [hash(token) for token in cls._recall_tokens(text)]
 
+    def _sorted_rows(self, table: _HashTable, g_idx: int) -> np.ndarray:
+        """The rows of a group of a table, oldest first (sorting the group first if needed)."""
+        group = table.groups[g_idx]
+        if g_idx in table.unsorted:
+            order = np.argsort(self.store.sequences(group.rows), kind="stable")
+            group.replace(group.rows[order])
+            table.vectors[g_idx].replace(table.vectors[g_idx].rows[order])
+            table.locate(group.rows)
+            table.unsorted.discard(g_idx)
+        return group.rows
+
+    def _sorted_group(self, group_idx: int) -> np.ndarray:
+        """The rows of a group of self.memory, oldest first (sorting the group first if needed)."""
+        return self._sorted_rows(self.tables[0], group_idx)
+
+    @_synchronized
+    def get_group_ids(self, group_idx: int) -> list[str]:
+        """Thought ids of a group, oldest first."""
+        return self.store.ids(self._sorted_group(group_idx))
+
+    @_synchronized
+    def get_group_thoughts(self, group_idx: int) -> list[str]:
+        """Texts of the thoughts in a group, oldest first."""
+        return self.store.get_many(self._sorted_group(group_idx))
+
+    def _group_postings(self, table: _HashTable, g_idx: int) -> _Postings:
+        """The keyword index of a group, built from the group's thoughts on first use."""
+        postings = table.postings.get(g_idx)
+        if postings is None:
+            group = table.groups[g_idx].rows
+            postings = table.postings[g_idx] = _Postings(
+                group, [self._token_hashes(thought_text) for thought_text in self.store.get_many(group)])
+        return postings
+
+    def _newest(self, table: _HashTable, g_idx: int, count: int) -> np.ndarray:
+        """The group's count newest thoughts: the tail of the group once it is in insertion order."""
+        rows = self._sorted_rows(table, g_idx)
+        return rows[max(len(rows) - count, 0):]
+
+    def _append(self, table: _HashTable, g_idx: int, rows: np.ndarray, embeddings: np.ndarray, texts: list[str] | None):
+        """
+        Appends thoughts to a group of a table, with their embeddings and (if the group's keyword
+        index is built) postings. texts may be None when the index is known not to be built.
+        """
+        table.locate(rows, len(table.groups[g_idx]))
+        table.groups[g_idx].extend(rows)
+        table.vectors[g_idx].extend(embeddings)
+        postings = table.postings.get(g_idx)
+        if postings is not None:
+            for row, thought_text in zip(rows.tolist(), texts):
+                postings.add(row, self._token_hashes(thought_text))
+
+    def _swap_remove(self, table: _HashTable, g_idx: int, position: int):
+        """
+        Removes the thought at a position of a group (its last thought takes its place, so the group
+        is no longer in insertion order). The thought must still be in the store.
+        """
+        group = table.groups[g_idx]
+        row = group.data.item(position)
+        group.swap_remove(position)
+        if position < len(group):
+            table.locate(group.rows[position:position + 1], position)
+            table.unsorted.add(g_idx)
+        table.vectors[g_idx].swap_remove(position)
+        postings = table.postings.get(g_idx)
+        if postings is not None:
+            postings.remove(row, self._token_hashes(self.store.get(row)))
+
+    def _position(self, table: _HashTable, g_idx: int, row: int) -> int | None:
+        """
+        Position of a thought in a group of a table, or None if it is not in the group. O(1) for a
+        thought stored once; each table tracks one position per row, so for a thought that a merge
+        also put in another group (see ThoughtStore.shared) the group is searched.
+        """
+        position = table.position(g_idx, row)
+        if position is None and self.store.shared(row):
+            positions = np.flatnonzero(table.groups[g_idx].rows == row)
+            position = int(positions[0]) if len(positions) else None
+        return position
+
+    def _extra_groups(self, embedding) -> list[int]:
+        """Group index of an embedding in each extra hash table (tables 1..L-1)."""
+        return [table.lsh.get_hash_index(embedding) for table in self.tables[1:]]
+
+    def _index_thought(self, row: int, thought_text: str, embedding, extra_groups: list[int]):
+        """Indexes a thought already placed in self.memory in the extra hash tables."""
+        for table, g_idx in zip(self.tables[1:], extra_groups):
+            self._append(table, g_idx, np.array([row], dtype=np.int32), np.asarray(embedding)[np.newaxis],
+                         [thought_text])
+            table.versions[g_idx] += 1
+
+    def _unindex_thoughts(self, rows: np.ndarray, embeddings: np.ndarray):
+        """
+        Removes thoughts (given with their embeddings) from the extra hash tables.
+        While resizing, a thought may not have been migrated out of the old extra tables yet
+        (the rehash drains table 0 first), so those are searched too.
+        """
+        extra_tables = self.tables[1:] + (self._old_tables[1:] if self.resizing else [])
+        for table in extra_tables:
+            for row, g_idx in zip(rows.tolist(), table.lsh.get_hash_indices(embeddings).tolist()):
+                position = self._position(table, g_idx, row)
+                if position is not None:
+                    self._swap_remove(table, g_idx, position)
+                    table.versions[g_idx] += 1
+
+    def _is_stored(self, t_id: str, h_idx: int, old_h_idx: int | None) -> bool:
+        """Duplicate check: is the thought in its group (or, mid-resize, in its not yet migrated old group)?"""
+        row = self.store.row(t_id)
+        if row is None:
+            return False
+        if self._position(self.tables[0], h_idx, row) is not None:
+            return True
+        return old_h_idx is not None and self._position(self._old_tables[0], old_h_idx, row) is not None
+
+    @_synchronized
     def insert_thought(self, thought_text: str):
         """
         Inserts a new inductive thought into the memory cache.
         This corresponds to the "insert" operation for memory updating.
         """
-        h_idx = self._get_hash_for_thought(thought_text)
-        if thought_text not in self.memory[h_idx]: # Avoid exact duplicate thoughts within a group
-            self.memory[h_idx].append(thought_text)
-            print(f"  🧠 MEMORY (+): Inserted thought '{thought_text}' into group {h_idx}.")
+        start = time.perf_counter()
+        embedding = self.embedder.get_embedding(thought_text)
+        h_idx = self.lsh.get_hash_index(embedding)
+        old_h_idx = self._old_tables[0].lsh.get_hash_index(embedding) if self.resizing else None
+        self.metrics.since("tim_hash_seconds", start)
+        t_id = self.store.thought_id(thought_text)
+        if not self._is_stored(t_id, h_idx, old_h_idx): # Avoid exact duplicate thoughts within a group
+            self._place_thought(t_id, thought_text, embedding, h_idx, self._extra_groups(embedding))
+            self.metrics.inc("tim_inserts_total")
+            self.metrics.observe("tim_insert_group_size", len(self.memory[h_idx]), Metrics.SIZE_BUCKETS)
+            logger.info("  🧠 MEMORY (+): Inserted thought '%s' into group %d.", thought_text, h_idx)
+            self._after_insert(1)
         else:
-            print(f"  🧠 MEMORY (=): Thought '{thought_text}' already in group {h_idx}. Not re-inserting.")
+            self.metrics.inc("tim_insert_duplicates_total")
+            logger.info("  🧠 MEMORY (=): Thought '%s' already in group %d. Not re-inserting.", thought_text, h_idx)
+        self.metrics.since("tim_insert_seconds", start)
 
+    @_synchronized
+    def insert_thoughts(self, batch: Iterable[str]) -> int:
+        """
+        Bulk version of insert_thought for a batch of thoughts (any iterable, including a generator).
+        The whole batch is embedded and hashed with one vectorized call per table, then appended
+        to its groups with the same duplicate check (also within the batch). Nothing is printed
+        per thought; returns the number of thoughts actually inserted.
+        """
+        batch = list(batch) # Read twice: embedded, then inserted
+        if not batch:
+            return 0
+        start = time.perf_counter()
+        embeddings = self.embedder.get_embeddings(batch)
+        table_groups = [table.lsh.get_hash_indices(embeddings).tolist() for table in self.tables]
+        old_groups = self._old_tables[0].lsh.get_hash_indices(embeddings).tolist() if self.resizing else None
+        self.metrics.since("tim_hash_seconds", start)
+        inserted = 0
+        for row, thought_text in enumerate(batch):
+            h_idx = table_groups[0][row]
+            t_id = self.store.thought_id(thought_text)
+            if self._is_stored(t_id, h_idx, old_groups[row] if old_groups is not None else None):
+                continue
+            self._place_thought(t_id, thought_text, embeddings[row], h_idx, [groups[row] for groups in table_groups[1:]])
+            self.metrics.observe("tim_insert_group_size", len(self.memory[h_idx]), Metrics.SIZE_BUCKETS)
+            inserted += 1
+        self.metrics.inc("tim_inserts_total", inserted)
+        self.metrics.inc("tim_insert_duplicates_total", len(batch) - inserted)
+        self._after_insert(inserted)
+        self.metrics.since("tim_insert_batch_seconds", start)
+        return inserted
+
+    def _place_thought(self, t_id: str, thought_text: str, embedding, h_idx: int, extra_groups: list[int]):
+        """Stores a new thought in group h_idx, indexes it everywhere, logs the insert and evicts if over capacity."""
+        row = self._place_thought_unlogged(t_id, thought_text, embedding, h_idx, extra_groups)
+        if self.log is not None:
+            self.log.append({"op": "insert", "group": h_idx, "extra": extra_groups, "text": thought_text})
+        self._enforce_capacity(h_idx, row)
+
+    def _place_thought_unlogged(self, t_id: str, thought_text: str, embedding, h_idx: int,
+                                extra_groups: list[int]) -> int:
+        row = self.store.add(thought_text, t_id, h_idx, self._clock)
+        self._clock += 1
+        self._append(self.tables[0], h_idx, np.array([row], dtype=np.int32), np.asarray(embedding)[np.newaxis],
+                     [thought_text])
+        self._touch_group(h_idx)
+        self._index_thought(row, thought_text, embedding, extra_groups)
+        self.store.set_sequences(row, self._next_sequence) # The newest thought
+        self._next_sequence += 1
+        return row
+
+    def _after_insert(self, inserted: int):
+        """Grows the table when it gets too full, advances an ongoing resize and snapshots if due."""
+        if self.resizing:
+            self._rehash(self.rehash_step * inserted)
+        elif self.max_load_factor is not None and len(self.store) > self.max_load_factor * self.lsh.num_groups:
+            num_groups = self.lsh.num_groups * 2
+            while len(self.store) > self.max_load_factor * num_groups: # A large batch may need several doublings
+                num_groups *= 2
+            self.start_resize(num_groups)
+        if self.log is not None:
+            self.log.maybe_snapshot(self)
+
+    # --- Eviction ---
+    def _enforce_capacity(self, h_idx: int, protected: int):
+        """
+        Evicts thoughts until group h_idx and the whole memory are within their limits, sparing the
+        thought just inserted (its row is protected). One insert usually evicts at most one thought per limit.
+        """
+        if self.group_capacity is not None:
+            while len(self.memory[h_idx]) > self.group_capacity:
+                self._evict(self._group_victim(h_idx, protected), h_idx)
+        if self.capacity is not None:
+            while len(self.store) > self.capacity:
+                victim = self._sampled_victim(protected)
+                if victim is None:
+                    break # Only thoughts not yet migrated by a resize were drawn; a later insert retries
+                self._evict(*victim)
+
+    def _group_victim(self, h_idx: int, protected: int) -> int:
+        """The group's thought with the lowest eviction priority among EVICTION_SAMPLES sampled ones."""
+        group = self.memory[h_idx].rows
+        if len(group) > self.EVICTION_SAMPLES:
+            group = group[self._eviction_rng.choice(len(group), self.EVICTION_SAMPLES, replace=False)]
+        candidates = group[group != protected]
+        priorities = self.eviction.priorities(self.store.last_used(candidates), self.store.recall_counts(candidates),
+                                              self._clock)
+        return int(candidates[np.argmin(priorities)])
+
+    def _sampled_victim(self, protected: int, attempts: int = 8) -> tuple[int, int] | None:
+        """
+        Approximates the policy over the whole memory (like Redis' sampled LRU): the thought with the
+        lowest priority among EVICTION_SAMPLES drawn uniformly from the store, with its group.
+        Candidates that are mid-migration in a resize (or protected) are skipped.
+        """
+        for _ in range(attempts):
+            rows, groups, last_used, recall_counts = self.store.sample(self.EVICTION_SAMPLES, self._eviction_rng)
+            valid = [sample for sample, (row, g_idx) in enumerate(zip(rows.tolist(), groups.tolist()))
+                     if row != protected and self._position(self.tables[0], g_idx, row) is not None]
+            if valid:
+                priorities = self.eviction.priorities(last_used[valid], recall_counts[valid], self._clock)
+                sample = valid[int(np.argmin(priorities))]
+                return int(rows[sample]), int(groups[sample])
+        return None
+
+    def _evict(self, row: int, g_idx: int):
+        t_id = self.store.id_of(row)
+        self._evict_unlogged(row, g_idx)
+        if self.log is not None:
+            self.log.append({"op": "evict", "group": g_idx, "id": t_id})
+
+    def _evict_unlogged(self, row: int, g_idx: int):
+        """
+        Removes one thought from group g_idx and everywhere it is indexed. The group's last thought
+        takes its place (in every array of the group), so nothing is shifted, and each table tracks
+        where its thoughts are, so the eviction does not depend on the size of the groups.
+        """
+        position = self._position(self.tables[0], g_idx, row)
+        embedding = self.tables[0].vectors[g_idx].rows[position].copy()
+        self._swap_remove(self.tables[0], g_idx, position)
+        self._unindex_thoughts(np.array([row]), embedding[np.newaxis])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("  🧠 MEMORY (Evict): Evicted thought '%s' from group %d.", self.store.get(row), g_idx)
+        self.store.remove(row)
+        self._touch_group(g_idx, dirty=False)
+        self.metrics.inc("tim_evictions_total")
+
+    # --- Incremental resizing ---
+    @property
+    def resizing(self) -> bool:
+        """True while thoughts are being moved from the old tables to the new ones."""
+        return self._old_tables is not None
+
+    @_synchronized
+    def start_resize(self, num_groups: int):
+        """
+        Switches to new tables with num_groups groups. Existing thoughts stay in the old tables
+        and are migrated rehash_step thoughts at a time by later inserts and recalls;
+        recall searches both tables until the migration is complete.
+        """
+        if self.resizing:
+            self.finish_resize()
+        if self.log is not None:
+            self.log.append({"op": "resize", "num_groups": num_groups})
+        self._start_resize_unlogged(num_groups)
+
+    def _start_resize_unlogged(self, num_groups: int):
+        self._old_tables = self.tables
+        self._rehash_cursor = 0
+        self._build_tables(self.lsh.resized(num_groups))
+        self.metrics.inc("tim_resizes_total")
+        logger.info("  🧠 MEMORY (Resize): Growing from %d to %d groups.", self._old_tables[0].lsh.num_groups, num_groups)
+
+    def _rehash(self, budget: int):
+        """
+        Moves up to budget thoughts (counted per table) from the old tables into the new ones.
+        Old groups are drained in index order; a large group is drained over several steps.
+        """
+        while self.resizing and budget > 0:
+            g_idx = self._rehash_cursor
+            for table_idx, old_table in enumerate(self._old_tables):
+                group = old_table.groups[g_idx]
+                if not group or budget <= 0:
+                    continue
+                count = min(budget, len(group))
+                remaining = len(group) - count
+                rows = group.rows[remaining:].copy()
+                embeddings = old_table.vectors[g_idx].rows[remaining:]
+                group.truncate(remaining)
+                old_table.vectors[g_idx].truncate(remaining)
+                budget -= count
+                new_table = self.tables[table_idx]
+                targets = new_table.lsh.get_hash_indices(embeddings)
+                if table_idx == 0:
+                    self.store.set_groups(rows, targets)
+                texts = None
+                old_postings = old_table.postings.get(g_idx)
+                if old_postings is not None and remaining: # The old group may still be searched
+                    texts = np.array(self.store.get_many(rows), dtype=object)
+                    for row, thought_text in zip(rows.tolist(), texts.tolist()):
+                        old_postings.remove(row, self._token_hashes(thought_text))
+                for new_g_idx in np.unique(targets).tolist():
+                    moved = targets == new_g_idx
+                    if new_g_idx in new_table.postings and texts is None: # Only then are the texts needed
+                        texts = np.array(self.store.get_many(rows), dtype=object)
+                    self._append(new_table, new_g_idx, rows[moved], embeddings[moved],
+                                 texts[moved].tolist() if texts is not None else None)
+                    new_table.unsorted.add(new_g_idx)
+                    if table_idx == 0:
+                        self._touch_group(new_g_idx)
+            if any(old_table.groups[g_idx] for old_table in self._old_tables):
+                continue # Budget used up in the middle of this group
+            for old_table in self._old_tables:
+                old_table.postings.pop(g_idx, None)
+            self._rehash_cursor += 1
+            if self._rehash_cursor == self._old_tables[0].lsh.num_groups:
+                self._old_tables = None
+
+    @_synchronized
+    def finish_resize(self):
+        """Migrates all remaining old groups at once (used before organizing or snapshotting)."""
+        if self.resizing:
+            self._rehash(float("inf"))
+
+    # --- Recall ---
+    def _probe_groups(self, query_embedding) -> list[tuple[_HashTable, int]]:
+        """
+        Stage 1 across all tables: the (table, group index) pairs to search for a query.
+        While resizing, the query's not yet migrated groups in the old tables are searched too.
+        """
+        probed = []
+        for table in self.tables:
+            probed.extend((table, g_idx) for g_idx in self._probes(table.lsh, query_embedding))
+        if self.resizing:
+            for table in self._old_tables:
+                probed.extend((table, g_idx) for g_idx in self._probes(table.lsh, query_embedding)
+                              if table.groups[g_idx])
+        return probed
+
+    def _probes(self, lsh: SimpleLSH | RandomProjectionLSH, query_embedding) -> list[int]:
+        if self.num_probes == 1:
+            return [lsh.get_hash_index(query_embedding)]
+        return lsh.get_probe_indices(query_embedding, self.num_probes)
+
+    @_synchronized
     def recall_thoughts(self, query_text: str, top_k: int = 3) -> list[str]:
         """
         Recalls relevant thoughts for a given query.
         This involves two stages as per the paper:
         1. LSH-based Retrieval: Find the nearest group using LSH.
+           With several tables and/or probes, candidates from every probed group are merged.
         2. Similarity-based Retrieval: Within that group, find the most similar thoughts. (Simplified here)
+           The score is keyword overlap, or the embedding cosine with similarity="cosine".
+        Repeated queries are answered from the recall cache as long as none of the groups they were
+        ranked from has changed. Queries are compared after collapsing whitespace if the embedder is
+        whitespace-insensitive (so the collapsed query would be ranked the same), otherwise verbatim.
         """
-        query_embedding = self.llm_agent.get_embedding(query_text)
-        h_idx = self.lsh.get_hash_index(query_embedding) # Stage 1: LSH-based retrieval
-        thought_group = self.memory[h_idx]
-        
-        print(f"  🧠 MEMORY (~): Recalling from group {h_idx} (contains {len(thought_group)} thoughts).")
-        if not thought_group:
-            return [] # No thoughts in the relevant group
+        start = time.perf_counter()
+        if getattr(self.embedder, "whitespace_insensitive", False):
+            cache_key = (" ".join(query_text.split()), top_k)
+        else:
+            cache_key = (query_text, top_k)
+        self._clock += 1
+        ranked = self._cached_recall(cache_key)
+        if ranked is not None:
+            self.metrics.inc("tim_recalls_total")
+            recalled = self.store.get_many(ranked)
+            self.metrics.since("tim_recall_seconds", start)
+            return recalled
+        query_embedding = self.embedder.get_embedding(query_text)
+        probed = self._probe_groups(query_embedding) # Stage 1: LSH-based retrieval
+        self.metrics.since("tim_hash_seconds", start)
+        group_sizes = sum(len(table.groups[g_idx]) for table, g_idx in probed)
+        self.metrics.observe("tim_recall_candidates", group_sizes, Metrics.SIZE_BUCKETS)
+
+        if len(probed) == 1:
+            logger.info("  🧠 MEMORY (~): Recalling from group %d (contains %d thoughts).", probed[0][1], group_sizes)
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info("  🧠 MEMORY (~): Recalling from groups %s across %d probed group(s) "
+                        "(%d thoughts before deduplication).",
+                        [g_idx for table, g_idx in probed if table is self.tables[0]], len(probed), group_sizes)
+        ranked, matched = [], False # No thoughts in the relevant group (or nothing asked for)
+        if group_sizes and top_k > 0:
+            if self.similarity == "cosine":
+                ranked, matched = self._rank_cosine(query_embedding, probed, top_k)
+            else:
+                ranked, matched = self._rank(query_text, probed, top_k)
+        if matched:
+            self.metrics.inc("tim_recall_hits_total")
+        self.store.record_recall(ranked, self._clock)
+        if self.resizing:
+            self._rehash(self.rehash_step)
+        elif self.recall_cache.max_size:
+            table_indices = {id(table): table_idx for table_idx, table in enumerate(self.tables)}
+            versions = tuple((table_indices[id(table)], g_idx, table.versions[g_idx]) for table, g_idx in probed)
+            self.recall_cache.put(cache_key, (self._generation, versions, ranked, matched))
+        self.metrics.inc("tim_recalls_total")
+        recalled = self.store.get_many(ranked) # Return top-k most relevant thoughts
+        self.metrics.since("tim_recall_seconds", start)
+        return recalled
+
+    def _cached_recall(self, cache_key: tuple[str, int]) -> list[int] | None:
+        """
+        The cached ranking for a query if it is still valid: same tables, and every group it was
+        ranked from at the same version. Records the hit like a normal recall would.
+        The cache is bypassed (a miss) while resizing, as every recall then moves thoughts between groups.
+        """
+        if not self.recall_cache.max_size:
+            return None
+        entry = self.recall_cache.get(cache_key) if not self.resizing else None
+        if entry is not None:
+            generation, versions, ranked, matched = entry
+            if generation == self._generation and all(self.tables[table_idx].versions[g_idx] == version
+                                                      for table_idx, g_idx, version in versions):
+                self.recall_cache.hits += 1
+                self.metrics.inc("tim_recall_cache_hits_total")
+                if matched:
+                    self.metrics.inc("tim_recall_hits_total")
+                self.store.record_recall(ranked, self._clock)
+                logger.info("  🧠 MEMORY (~): Recalled %d thought(s) from the recall cache.", len(ranked))
+                return ranked
+            self.recall_cache.discard(cache_key) # Stale: one of its groups changed since
+            self.recall_cache.stale += 1
+        self.recall_cache.misses += 1
+        self.metrics.inc("tim_recall_cache_misses_total")
+        return None
 
+    def _top_k(self, rows: list[np.ndarray], scores: list[np.ndarray], top_k: int) -> list[int]:
+        """
+        The top-k of the candidates of all probed groups by score (descending), then by recency
+        (newer thoughts first as tie-breaker). Only each group's top-k scores (and ties) can win,
+        so only those are sorted. A thought found in several tables has the same score in each
+        and is listed once.
+        """
+        best_rows, best_scores = [], []
+        for group_rows, group_scores in zip(rows, scores):
+            if len(group_rows) > top_k:
+                kth = np.partition(group_scores, len(group_rows) - top_k)[len(group_rows) - top_k]
+                kept = group_scores >= kth
+                group_rows, group_scores = group_rows[kept], group_scores[kept]
+            best_rows.append(group_rows)
+            best_scores.append(group_scores)
+        best_rows = np.concatenate(best_rows)
+        order = np.lexsort((self.store.sequences(best_rows), np.concatenate(best_scores)))[::-1]
+        if len(rows) == 1:
+            return best_rows[order[:top_k]].tolist()
+        return list(dict.fromkeys(best_rows[order].tolist()))[:top_k]
+
+    def _rank(self, query_text: str, probed: list[tuple[_HashTable, int]], top_k: int) -> tuple[list[int], bool]:
         # Stage 2: Similarity-based Retrieval (Simplified for demo)
         # A real system would use semantic similarity (e.g., cosine similarity on embeddings).
-        # This demo uses a crude keyword overlap score.
-        query_words = set(query_text.lower().split())
-        def crude_similarity_score(thought: str) -> int:
-            thought_words = set(thought.lower().split())
-            return len(thought_words.intersection(query_words))
+        # This demo uses a crude keyword overlap score: the number of query words a thought contains.
+        # Only the postings of the query's words are read, so thoughts sharing no word are never touched.
+        start = time.perf_counter()
+        query_hashes = self._token_hashes(query_text)
+        rows, scores = [], []
+        for table, g_idx in probed:
+            if table.groups[g_idx]:
+                group_rows, group_scores = self._group_postings(table, g_idx).scores(query_hashes)
+                if len(group_rows):
+                    rows.append(group_rows)
+                    scores.append(group_scores)
+        ranked = self._top_k(rows, scores, top_k) if rows else []
+        if len(ranked) < top_k:
+            # Not enough overlapping thoughts: like a full sort, fill up with the newest zero-score ones.
+            newest = [self._newest(table, g_idx, top_k) for table, g_idx in probed if table.groups[g_idx]]
+            if newest:
+                candidates = np.concatenate(newest)
+                candidates = candidates[~np.isin(candidates, ranked)]
+                order = np.argsort(self.store.sequences(candidates), kind="stable")[::-1]
+                ranked += list(dict.fromkeys(candidates[order].tolist()))[:top_k - len(ranked)]
+        self.metrics.since("tim_rank_seconds", start)
+        return ranked, bool(rows)
+
+    def _rank_cosine(self, query_embedding, probed: list[tuple[_HashTable, int]],
+                     top_k: int) -> tuple[list[int], bool]:
+        """
+        Stage 2 with semantic similarity: each probed group is scored with one matrix-vector
+        product over its embedding matrix, and the top-k is selected over all groups' scores.
+        """
+        start = time.perf_counter()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.ndim != 1:
+            raise ValueError("similarity='cosine' needs vector embeddings, e.g. MockLLMAgent(embedding_dim=64).")
+        query_norm = np.linalg.norm(query)
+        rows, scores = [], []
+        for table, g_idx in probed:
+            if table.groups[g_idx]:
+                matrix = table.vectors[g_idx].rows
+                denominators = np.sqrt(np.einsum("ij,ij->i", matrix, matrix)) * query_norm
+                group_scores = matrix @ query
+                np.divide(group_scores, denominators, out=group_scores, where=denominators > 0)
+                rows.append(table.groups[g_idx].rows)
+                scores.append(group_scores)
+        ranked = self._top_k(rows, scores, top_k)
+        self.metrics.since("tim_rank_seconds", start)
+        return ranked, any(score.max() > 0 for score in scores)
 
-        # Sort thoughts in the group by similarity (descending), then by recency (newer thoughts first as tie-breaker)
-        sorted_thoughts = sorted(thought_group, key=lambda t: (crude_similarity_score(t), thought_group.index(t)), reverse=True)
-        return sorted_thoughts[:top_k] # Return top-k most relevant thoughts
+    # --- Organization ---
+    @property
+    def dirty_groups(self) -> list[int]:
+        """Groups changed by inserts since they were last organized, in the order they became dirty."""
+        with self._lock:
+            return list(self._dirty_groups)
 
-    def organize_memory_group(self, group_idx: int, mode: str = "all"):
+    def _touch_group(self, group_idx: int, dirty: bool = True):
+        """Records a change to a group of self.memory (and, unless it was organization itself, marks it dirty)."""
+        self._group_versions[group_idx] += 1
+        if dirty:
+            self._dirty_groups.setdefault(group_idx, None)
+
+    def organize_memory_group(self, group_idx: int, mode: str = "all", verbose: bool = True) -> bool:
         """
         Applies forget and/or merge operations to a specific memory group.
         This is part of the "Organization for Memory Updating" described in the paper.
+        The LLM works on a copy of the group's texts without holding the cache lock, so recall keeps
+        serving the old group meanwhile; the result is then applied to the group by id in one step.
+        If the group changed in the meantime, nothing is applied and the group stays dirty.
+        verbose=False skips the trace messages (used by the background organizer).
+        Returns True if the organization was applied (even when it changed nothing).
         """
-        if group_idx not in self.memory or not self.memory[group_idx]:
-            print(f"  🧠 MEMORY (Org): Group {group_idx} is empty or invalid. Nothing to organize.")
-            return
+        say = logger.info if verbose else _no_trace
+        with self._lock:
+            self.finish_resize() # Group indices refer to the new table, so it must be complete
+            if group_idx not in self.memory or not self.memory[group_idx]:
+                say("  🧠 MEMORY (Org): Group %d is empty or invalid. Nothing to organize.", group_idx)
+                self._dirty_groups.pop(group_idx, None)
+                return False
+            lsh = self.lsh
+            version = self._group_versions[group_idx]
+            original_ids = self.get_group_ids(group_idx)
+            original_thoughts = self.get_group_thoughts(group_idx)
+        plan = _plan_organization(self.llm_agent, group_idx, original_ids, original_thoughts, mode, say, self.metrics,
+                                  self.embedder)
+        return self._commit_organization(group_idx, lsh, version, original_ids, *plan, say=say)
 
-        original_thoughts = list(self.memory[group_idx]) # Keep a copy for comparison
-        print(f"\n  🧠 MEMORY (Org): Organizing group {group_idx}. Original thoughts: {original_thoughts}")
+    def organize_all_groups(self, workers: int | None = None, mode: str = "all",
+                            batch_size: int = 50_000) -> dict[str, float]:
+        """
+        Organizes every non-empty group in one sweep. LSH groups are independent, so with
+        workers > 1 (default: one per CPU) the groups are planned in a process pool, unless the memory
+        is smaller than PARALLEL_MIN_THOUGHTS. Groups are copied one at a time (each under a short hold
+        of the lock) and streamed to the workers in tasks of about batch_size thoughts; the workers
+        plan them, embed the merged texts, and send back only the groups that changed. Each group's
+        result is applied atomically as its batch completes, while later batches are still being
+        planned, with the same concurrent-change check as organize_memory_group. Returns sweep statistics.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.finish_resize() # Group indices refer to the new table, so it must be complete
+            lsh = self.lsh
+            group_indices = [group_idx for group_idx, group in self.memory.items() if group]
+            num_thoughts = len(self.store)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # No more processes than tasks, and none at all when starting them costs more than they save.
+        workers = min(workers, -(-num_thoughts // batch_size))
+        if num_thoughts < self.PARALLEL_MIN_THOUGHTS:
+            workers = 1
+        copied: dict[int, tuple[int, list[str]]] = {} # Group -> version and ids when copied, until applied
+        stats = collections.Counter()
 
-        current_group_thoughts = list(self.memory[group_idx]) # Work on a mutable copy
+        def copy_group(group_idx: int) -> list[str] | None:
+            """The group's texts (its version and ids are kept for the commit), or None to skip it."""
+            with self._lock:
+                if self.lsh is not lsh or not self.memory[group_idx]: # Resized or emptied since the sweep began
+                    return None
+                rows = self._sorted_group(group_idx)
+                copied[group_idx] = (self._group_versions[group_idx], self.store.ids(rows))
+                return self.store.get_many(rows)
 
-        # "Forget, i.e., remove unnecessary thoughts from the memory"
-        if mode in ["forget", "all"]:
-            thoughts_to_forget = self.llm_agent.identify_thoughts_to_forget(current_group_thoughts)
-            if thoughts_to_forget:
-                print(f"  🧠 MEMORY (Forget): Identified to forget: {thoughts_to_forget}")
-                current_group_thoughts = [t for t in current_group_thoughts if t not in thoughts_to_forget]
-            else:
-                print(f"  🧠 MEMORY (Forget): No thoughts identified for forgetting in this group.")
-        
-        # "Merge, i.e., merge similar thoughts in the memory"
-        if mode in ["merge", "all"]:
-            if current_group_thoughts: # Ensure there are thoughts left after potential forgetting
-                merged_group_thoughts = self.llm_agent.merge_thoughts_in_group(current_group_thoughts)
-                if merged_group_thoughts != current_group_thoughts: # Check if merge actually changed anything
-                    print(f"  🧠 MEMORY (Merge): Merged. New group state: {merged_group_thoughts}")
-                    current_group_thoughts = merged_group_thoughts
-                else:
-                    print(f"  🧠 MEMORY (Merge): No effective merge operations performed on remaining thoughts.")
-            else:
-                print(f"  🧠 MEMORY (Merge): Group empty after forgetting, skipping merge.")
-        
-        self.memory[group_idx] = current_group_thoughts # Update the memory group
-        if self.memory[group_idx] != original_thoughts:
-             print(f"  🧠 MEMORY (Org): Group {group_idx} updated. Final thoughts: {self.memory[group_idx]}")
+        def commit(group_idx: int, plan: tuple | None):
+            version, original_ids = copied.pop(group_idx)
+            if plan is None: # Unchanged: only marks the group as organized (the texts are not needed)
+                plan = (original_ids, [], [], 0, {})
+            stats["changed"] += plan[0] != original_ids
+            stats["applied"] += self._commit_organization(group_idx, lsh, version, original_ids, *plan)
+
+        if workers <= 1:
+            for group_idx in group_indices:
+                original_thoughts = copy_group(group_idx)
+                if original_thoughts is not None:
+                    commit(group_idx, _plan_organization(self.llm_agent, group_idx, copied[group_idx][1],
+                                                         original_thoughts, mode, metrics=self.metrics,
+                                                         embedder=self.embedder))
         else:
-             print(f"  🧠 MEMORY (Org): No changes to group {group_idx} after organization attempts.")
+            def commit_batch(future: concurrent.futures.Future):
+                for group_idx, plan in future.result():
+                    commit(group_idx, plan)
+
+            # Spawned (not forked) workers: the cache may have other threads, e.g. a MemoryOrganizer.
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                        initializer=_init_organize_worker,
+                                                        initargs=(self.llm_agent, self.embedder)) as pool:
+                pending: collections.deque[concurrent.futures.Future] = collections.deque()
+                batch, batch_thoughts = [], 0
+                for position, group_idx in enumerate(group_indices):
+                    original_thoughts = copy_group(group_idx)
+                    if original_thoughts is not None:
+                        batch.append((group_idx, original_thoughts))
+                        batch_thoughts += len(original_thoughts)
+                    if batch and (batch_thoughts >= batch_size or position == len(group_indices) - 1):
+                        pending.append(pool.submit(_organize_batch, batch, mode))
+                        batch, batch_thoughts = [], 0
+                    # Batches are applied in group order, so recency (sequence) order matches a serial sweep.
+                    while pending and pending[0].done():
+                        commit_batch(pending.popleft())
+                while pending:
+                    commit_batch(pending.popleft())
+        elapsed = time.perf_counter() - start
+        logger.info("  🧠 MEMORY (Org): Organized %d groups (%d changed, %d not applied) with %d worker(s) in %.3fs.",
+                    len(group_indices), stats["changed"], len(group_indices) - stats["applied"], workers, elapsed)
+        return {"groups": len(group_indices), "changed": stats["changed"], "applied": stats["applied"],
+                "workers": workers, "seconds": elapsed}
+
+    def _commit_organization(self, group_idx: int, lsh: SimpleLSH | RandomProjectionLSH, version: int,
+                             original_ids: list[str], current_ids: list[str], current_group_thoughts: list[str],
+                             records: list[dict], num_forgotten: int, embeddings: dict[str, np.ndarray],
+                             say=_no_trace) -> bool:
+        """Applies a planned organization in one step, unless the group changed since it was copied."""
+        with self._lock:
+            if self.lsh is not lsh or self._group_versions[group_idx] != version:
+                say("  🧠 MEMORY (Org): Group %d changed during organization. Not applied.", group_idx)
+                self.metrics.inc("tim_organize_conflicts_total")
+                return False
+            self._dirty_groups.pop(group_idx, None)
+            self.metrics.inc("tim_organized_total")
+            if current_ids != original_ids:
+                if self.log is not None:
+                    for record in records:
+                        self.log.append(record)
+                self._apply_group_update(group_idx, current_ids, current_group_thoughts, embeddings)
+                self.metrics.inc("tim_forgotten_total", num_forgotten)
+                say("  🧠 MEMORY (Org): Group %d updated. Final thoughts: %s", group_idx, current_group_thoughts)
+                if self.log is not None:
+                    self.log.maybe_snapshot(self)
+            else:
+                say("  🧠 MEMORY (Org): No changes to group %d after organization attempts.", group_idx)
+            return True
+
+    def _apply_group_update(self, group_idx: int, final_ids: list[str], final_thoughts: list[str],
+                            embeddings: dict[str, np.ndarray] | None = None):
+        """
+        Replaces a group with its organized contents and brings the store, extra tables,
+        inverted indexes, embedding matrices and sequence numbers in line with it.
+        The final group order becomes the recency order, as if the group had been rewritten.
+        Kept thoughts reuse their stored embeddings; new (merged) texts use the given embeddings,
+        computed by the plan outside the lock. Only texts without one (on replay) are embedded here.
+        """
+        table = self.tables[0]
+        group_rows = self._sorted_group(group_idx).copy()
+        position = {t_id: index for index, t_id in enumerate(self.store.ids(group_rows))}
+        added = [(t_id, t) for t_id, t in zip(final_ids, final_thoughts) if t_id not in position]
+        added_rows = [self.store.add(thought_text, t_id, group_idx, self._clock) for t_id, thought_text in added]
+        final_set = set(final_ids)
+        removed = [index for t_id, index in position.items() if t_id not in final_set]
+        if removed:
+            self._unindex_thoughts(group_rows[removed], table.vectors[group_idx].rows[removed])
+            for row in group_rows[removed].tolist():
+                self.store.remove(row)
 
+        source = table.vectors[group_idx].rows
+        if added:
+            embeddings = embeddings or {}
+            missing = [(t_id, thought_text) for t_id, thought_text in added if t_id not in embeddings]
+            if missing:
+                computed = self.embedder.get_embeddings([thought_text for _, thought_text in missing])
+                embeddings = {**embeddings, **{t_id: embedding for (t_id, _), embedding in zip(missing, computed)}}
+            added_embeddings = np.array([embeddings[t_id] for t_id, _ in added])
+            source = np.concatenate((source, added_embeddings))
+            position.update((t_id, len(group_rows) + index) for index, (t_id, _) in enumerate(added))
+            group_rows = np.concatenate((group_rows, np.array(added_rows, dtype=np.int32)))
+        order = [position[t_id] for t_id in final_ids]
+        final_rows = group_rows[order]
+        table.groups[group_idx].replace(final_rows) # Update the memory group
+        table.locate(final_rows)
+        table.vectors[group_idx].replace(source[order])
+        table.postings.pop(group_idx, None) # Rebuilt from the new texts when the group is next searched
+        self._touch_group(group_idx, dirty=False)
+        for row, (t_id, thought_text) in zip(added_rows, added):
+            embedding = source[position[t_id]]
+            self._index_thought(row, thought_text, embedding, self._extra_groups(embedding))
+        self.store.set_sequences(final_rows, np.arange(self._next_sequence, self._next_sequence + len(final_rows)))
+        self._next_sequence += len(final_rows)
+        if len(final_rows):
+            # New sequence numbers change the recency order in the extra-table groups of these thoughts too.
+            for extra_table in self.tables[1:]:
+                for g_idx in np.unique(extra_table.lsh.get_hash_indices(table.vectors[group_idx].rows)).tolist():
+                    extra_table.versions[g_idx] += 1
+                    extra_table.unsorted.add(g_idx)
 
+    # --- Persistence support ---
+    def _load_rows(self, rows: np.ndarray, groups: np.ndarray, extra_groups: np.ndarray,
+                   sequence: np.ndarray, next_sequence: int, num_groups: int, embeddings: np.ndarray):
+        """
+        Fills an empty cache from snapshot rows sorted by (group, sequence).
+        rows holds each snapshot row's store row. Texts stay in the store's memory-mapped file and each
+        table-0 group's embedding matrix is a view of the memory-mapped embeddings until it is modified.
+        """
+        if num_groups != self.lsh.num_groups: # The memory was resized before the snapshot was taken
+            self._build_tables(self.lsh.resized(num_groups))
+        for g_idx, start, end in self._group_slices(groups):
+            self.memory[g_idx] = _GroupMatrix(rows[start:end].copy())
+            self.tables[0].locate(rows[start:end])
+            self.tables[0].vectors[g_idx] = _GroupMatrix(embeddings[start:end])
+            self._touch_group(g_idx) # Not known to be organized
+        for table_idx in range(1, len(self.tables)):
+            order = np.lexsort((sequence, extra_groups[:, table_idx - 1]))
+            ordered_rows = rows[order]
+            ordered_embeddings = embeddings[order]
+            table = self.tables[table_idx]
+            for g_idx, start, end in self._group_slices(extra_groups[order, table_idx - 1]):
+                table.groups[g_idx] = _GroupMatrix(ordered_rows[start:end])
+                table.locate(ordered_rows[start:end])
+                table.vectors[g_idx] = _GroupMatrix(ordered_embeddings[start:end])
+        self._next_sequence = next_sequence
+
+    @staticmethod
+    def _group_slices(sorted_groups: np.ndarray):
+        """Yields (group, start, end) for each run of equal values in a sorted group array."""
+        if not len(sorted_groups):
+            return
+        boundaries = np.flatnonzero(np.diff(sorted_groups)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(sorted_groups)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            yield int(sorted_groups[start]), start, end
+
+    def _replay_record(self, record: dict):
+        """Re-applies one logged operation during recovery (without logging it again)."""
+        if record["op"] == "resize":
+            # Replay migrates everything at once; later records refer to the new table.
+            self._start_resize_unlogged(record["num_groups"])
+            self.finish_resize()
+            return
+        g_idx = record["group"]
+        if record["op"] == "insert":
+            t_id = self.store.thought_id(record["text"])
+            if not self._is_stored(t_id, g_idx, None):
+                self._place_thought_unlogged(t_id, record["text"], self.embedder.get_embedding(record["text"]),
+                                             g_idx, record["extra"])
+            return
+        if record["op"] == "evict":
+            if self._is_stored(record["id"], g_idx, None):
+                self._evict_unlogged(self.store.row(record["id"]), g_idx)
+            return
+        original = dict(zip(self.get_group_ids(g_idx), self.get_group_thoughts(g_idx)))
+        if record["op"] == "forget":
+            forget_ids = set(record["ids"])
+            final_ids = [t_id for t_id in original if t_id not in forget_ids]
+            final_thoughts = [original[t_id] for t_id in final_ids]
+        else: # merge
+            final_ids = list(dict.fromkeys(record["ids"])) # Logs written before merges were deduplicated
+            final_thoughts = [record["texts"].get(t_id) or original[t_id] for t_id in final_ids]
+        self._apply_group_update(g_idx, final_ids, final_thoughts)
+
+    @_synchronized
+    def close(self):
+        """Closes the on-disk log, if any."""
+        if self.log is not None:
+            self.log.close()
+
+    @_synchronized
     def display_memory(self):
         """Utility function to print the current state of the memory cache."""
+        self.finish_resize()
         print("\n--- 🏦 Current TiM Memory State ---")
         empty = True
-        for h_idx, thoughts in self.memory.items():
-            if thoughts: # Only print groups that have thoughts
+        for h_idx, group in self.memory.items():
+            if group: # Only print groups that have thoughts
                 empty = False
                 print(f"  Group {h_idx}:")
-                for thought in thoughts:
+                for thought in self.get_group_thoughts(h_idx):
                     print(f"    - \"{thought}\"")
         if empty:
             print("  Memory is currently empty.")
         print("---------------------------------\n")
 
+# --- Background Organization ---
+class MemoryOrganizer:
+    """
+    Keeps the memory tidy in the background: on every tick it organizes (forget + merge) the
+    groups that changed since they were last organized, oldest change first, within a budget
+    of max_groups groups and/or max_ms milliseconds. Ticks are skipped while the memory is resizing.
+    Several caches (e.g. per-user shards) can share one organizer; they take turns starting a tick.
+    """
+    def __init__(self, cache: MemoryCache | None = None, interval: float = 1.0, max_groups: int | None = 4,
+                 max_ms: float | None = None, mode: str = "all"):
+        if max_groups is None and max_ms is None:
+            raise ValueError("Set max_groups and/or max_ms to bound the work per tick.")
+        self.caches: list[MemoryCache] = [cache] if cache is not None else []
+        self.interval = interval # Seconds between ticks
+        self.max_groups = max_groups
+        self.max_ms = max_ms
+        self.mode = mode
+        self.groups_organized = 0
+        self._next_cache = 0 # Cache the next tick starts with
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def watch(self, cache: MemoryCache):
+        """Adds a cache to organize."""
+        self.caches.append(cache)
+
+    def tick(self) -> int:
+        """Organizes dirty groups until the budget is used up; returns the number organized."""
+        start = time.perf_counter()
+        caches = list(self.caches) # watch() may be called from another thread
+        if not caches:
+            return 0
+        first = self._next_cache % len(caches)
+        self._next_cache = first + 1
+        organized = 0
+        for cache in caches[first:] + caches[:first]:
+            if cache.resizing:
+                continue
+            for group_idx in cache.dirty_groups:
+                if self.max_groups is not None and organized >= self.max_groups:
+                    break
+                if self.max_ms is not None and (time.perf_counter() - start) * 1000 >= self.max_ms:
+                    break
+                if cache.organize_memory_group(group_idx, mode=self.mode, verbose=False):
+                    organized += 1
+            else:
+                continue
+            break # Budget used up
+        self.groups_organized += organized
+        return organized
+
+    def start(self):
+        """Starts ticking in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tim-memory-organizer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.tick()
+
+    def stop(self):
+        """Stops the background thread after its current tick."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
 # --- TiM System (Main Orchestrator) ---
 class TiMSystem:
     """
     Orchestrates the Think-in-Memory workflow, integrating the LLM agent, LSH, and Memory Cache.
     This class represents the overall TiM framework.
     """
-    def __init__(self):
-        self.llm_agent = MockLLMAgent()
+    def __init__(self, num_groups: int = 6, embedding_dim: int = 64, seed: int = 0,
+                 num_tables: int = 1, num_probes: int = 1, embedding_cache_size: int = 100_000,
+                 memory_dir: str | None = None, max_load_factor: float | None = 64.0,
+                 organize_interval: float | None = None, llm_latency: float = 0.0, verbose: bool = False,
+                 similarity: str = "keyword", recall_cache_size: int = 10_000, capacity: int | None = None,
+                 group_capacity: int | None = None, eviction: str | EvictionPolicy = "lru"):
+        if verbose:
+            enable_tracing() # Step-by-step output, as in the interactive demo
+        self.metrics = Metrics() # Shared by all memory shards
+        self.llm_agent = MockLLMAgent(embedding_dim=embedding_dim, latency=llm_latency)
         # Using a small number of groups for easier observation in the demo.
         # The paper's LSH (Eq. 1) implies 'b' groups.
-        self.lsh = SimpleLSH(num_groups=5) 
-        self.memory_cache = MemoryCache(self.lsh, self.llm_agent)
-        print("TiM System Initialized. LLM-agnostic design allows plugging in different LLMs/LSH.")
+        self.lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=embedding_dim, seed=seed)
+        self.embedder = CachedEmbeddingProvider(self.llm_agent, max_size=embedding_cache_size)
+        # With memory_dir set, memory survives restarts: it is recovered from (and logged to) that directory.
+        self.memory_dir = memory_dir
+        self.memory_log = MemoryLog(memory_dir) if memory_dir is not None else None
+        # Options of every memory cache; capacity limits (and eviction) apply to each user shard separately.
+        self._cache_options = {"num_tables": num_tables, "num_probes": num_probes, "max_load_factor": max_load_factor,
+                               "metrics": self.metrics, "similarity": similarity,
+                               "recall_cache_size": recall_cache_size, "capacity": capacity,
+                               "group_capacity": group_capacity, "eviction": eviction}
+        self.memory_cache = MemoryCache(self.lsh, self.llm_agent, embedder=self.embedder, log=self.memory_log,
+                                        **self._cache_options)
+        # Per-user memory shards for multi-session serving (see process_query_async), created on first use.
+        # Each shard has its own cache lock, plus a session lock that keeps one user's turns in order.
+        self._shards: dict[str, MemoryCache] = {}
+        self._session_locks: dict[str | None, asyncio.Lock] = {}
+        # With organize_interval set, changed groups are forgotten/merged by a background worker.
+        self.organizer = None
+        if organize_interval is not None:
+            self.organizer = MemoryOrganizer(self.memory_cache, interval=organize_interval)
+            self.organizer.start()
+        if self.memory_log is not None:
+            logger.info("Loaded %d thoughts from '%s' (%d logged operations replayed).",
+                        len(self.memory_cache.store), memory_dir, self.memory_log.ops_since_snapshot)
+        logger.info("TiM System Initialized. LLM-agnostic design allows plugging in different LLMs/LSH.")
 
     def process_query(self, user_query: str):
         """
@@ -323,24 +2490,27 @@ class TiMSystem:
         1. Recall and Generation
         2. Post-think and Update
         """
-        print(f"\n👤 User Query: \"{user_query}\"")
+        logger.info('\n👤 User Query: "%s"', user_query)
 
         # Stage 1: Recall and Generation
         # "before generating a response, a LLM agent recalls relevant thoughts from memory"
-        print("  ➡️ Stage 1: Recall and Generation")
+        logger.info("  ➡️ Stage 1: Recall and Generation")
+        start = time.perf_counter()
         recalled_thoughts = self.memory_cache.recall_thoughts(user_query, top_k=3)
         if recalled_thoughts:
-            print(f"  💡 Recalled Thoughts: {recalled_thoughts}")
+            logger.info("  💡 Recalled Thoughts: %s", recalled_thoughts)
         else:
-            print("  💡 No relevant thoughts recalled from memory for this query.")
+            logger.info("  💡 No relevant thoughts recalled from memory for this query.")
 
         # LLM generates a response, potentially using the recalled thoughts.
         agent_response = self.llm_agent.generate_response(user_query, recalled_thoughts)
-        print(f"  🤖 Agent Response: \"{agent_response}\"")
+        logger.info('  🤖 Agent Response: "%s"', agent_response)
+        self.metrics.since("tim_stage1_seconds", start)
 
         # Stage 2: Post-think and Update
         # "after generating a response, the LLM agent post-thinks and incorporates ... new thoughts to update the memory"
-        print("  ⬅️ Stage 2: Post-think and Update")
+        logger.info("  ⬅️ Stage 2: Post-think and Update")
+        start = time.perf_counter()
         # LLM generates an inductive thought from the current query-response pair.
         new_thought = self.llm_agent.generate_inductive_thought(user_query, agent_response)
         
@@ -349,18 +2519,93 @@ class TiMSystem:
         if new_thought and not new_thought.startswith("Concluded: Standard Response"):
             self.memory_cache.insert_thought(new_thought)
         else:
-            print(f"  🧠 MEMORY (-): No specific new thought generated or stored for this interaction.")
+            logger.info("  🧠 MEMORY (-): No specific new thought generated or stored for this interaction.")
+        self.metrics.since("tim_stage2_seconds", start)
         
         return agent_response
 
+    def memory_for(self, user_id: str | None) -> MemoryCache:
+        """The memory shard of a user (None: the shared memory_cache), created on first use."""
+        if user_id is None:
+            return self.memory_cache
+        cache = self._shards.get(user_id)
+        if cache is None:
+            log = None
+            if self.memory_dir is not None:
+                # Readable and collision-free directory name for any user id
+                safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)[:64]
+                log = MemoryLog(os.path.join(self.memory_dir, "users", f"{safe_id}-{content_hash(user_id)[:8]}"))
+            cache = MemoryCache(self.lsh, self.llm_agent, embedder=self.embedder, log=log, **self._cache_options)
+            self._shards[user_id] = cache
+            self._session_locks[user_id] = asyncio.Lock()
+            if self.organizer is not None:
+                self.organizer.watch(cache)
+        return cache
+
+    async def process_query_async(self, user_query: str, user_id: str | None = None) -> str:
+        """
+        Async version of process_query for serving many conversations at once.
+        Recall and update use the user's own memory shard, and the (simulated) LLM calls are
+        awaited, so the LLM latency of concurrent sessions overlaps. The memory calls (embedding,
+        ranking, inserting) run in worker threads, so they do not stall the event loop either.
+        Turns of the same user run one after another; other users are never blocked by them.
+        """
+        cache = self.memory_for(user_id)
+        session_lock = self._session_locks.setdefault(user_id, asyncio.Lock())
+        async with session_lock:
+            # Stage 1: Recall and Generation
+            start = time.perf_counter()
+            recalled_thoughts = await asyncio.to_thread(cache.recall_thoughts, user_query, top_k=3)
+            agent_response = await self.llm_agent.generate_response_async(user_query, recalled_thoughts)
+            self.metrics.since("tim_stage1_seconds", start)
+            # Stage 2: Post-think and Update
+            start = time.perf_counter()
+            new_thought = await self.llm_agent.generate_inductive_thought_async(user_query, agent_response)
+            if new_thought and not new_thought.startswith("Concluded: Standard Response"):
+                await asyncio.to_thread(cache.insert_thought, new_thought)
+            self.metrics.since("tim_stage2_seconds", start)
+        return agent_response
+
+    def ingest_interactions(self, interactions: Iterable[tuple[str, str]], batch_size: int = 1024) -> dict[str, float]:
+        """
+        Bulk-ingests (query, response) pairs, e.g. to pre-populate or replay a user's history.
+        Accepts any iterable (including a generator) and consumes it in batches: thoughts are
+        generated per batch and inserted with MemoryCache.insert_thoughts. Returns throughput stats.
+        """
+        start = time.perf_counter()
+        num_interactions = 0
+        num_inserted = 0
+        iterator = iter(interactions)
+        while batch := list(itertools.islice(iterator, batch_size)):
+            num_interactions += len(batch)
+            thoughts = self.llm_agent.generate_inductive_thoughts(batch)
+            # Same filter as process_query: skip thoughts derived from generic "Standard Response" answers.
+            thoughts = [t for t in thoughts if t and not t.startswith("Concluded: Standard Response")]
+            num_inserted += self.memory_cache.insert_thoughts(thoughts)
+        elapsed = time.perf_counter() - start
+        rate = num_interactions / elapsed if elapsed > 0 else float("inf")
+        logger.info("  🧠 MEMORY (+): Ingested %d interactions, inserted %d new thoughts in %.3fs (%.0f interactions/sec).",
+                    num_interactions, num_inserted, elapsed, rate)
+        return {"interactions": num_interactions, "inserted": num_inserted,
+                "seconds": elapsed, "interactions_per_sec": rate}
+
+    def close(self):
+        """Stops the background organizer (if any) and closes the memory and all user shards."""
+        if self.organizer is not None:
+            self.organizer.stop()
+        self.memory_cache.close()
+        for cache in self._shards.values():
+            cache.close()
+
     def manage_memory_interactive(self):
         """
         Provides an interactive command-line interface to manage memory operations.
         Allows demonstration of 'forget' and 'merge' on specific groups.
         """
         print("\n--- 🛠️ Memory Management ---")
-        print("Enter command for a specific group (e.g., 'forget 0', 'merge 1', 'organize_all 2').")
-        print("Options: 'display', 'forget <idx>', 'merge <idx>', 'organize_all <idx>', 'back'")
+        print("Enter command for a specific group (e.g., 'forget 0', 'merge 1', 'organize_all 2'),")
+        print("or 'organize_all' without an index to organize every group.")
+        print("Options: 'display', 'dirty', 'metrics', 'forget <idx>', 'merge <idx>', 'organize_all <idx>', 'back'")
         while True:
             cmd_input = input("Enter memory command: ").strip().lower().split()
             if not cmd_input: continue
@@ -372,15 +2617,22 @@ class TiMSystem:
                 break
             elif action == "display":
                 self.memory_cache.display_memory()
+            elif action == "metrics":
+                print(self.metrics.to_prometheus(), end="")
+            elif action == "organize_all" and len(cmd_input) == 1:
+                self.memory_cache.organize_all_groups()
+            elif action == "dirty":
+                print(f"Groups changed since they were last organized: {self.memory_cache.dirty_groups}")
             elif action in ["forget", "merge", "organize_all"] and len(cmd_input) > 1:
                 try:
                     group_idx = int(cmd_input[1])
-                    if 0 <= group_idx < self.lsh.num_groups:
+                    num_groups = self.memory_cache.lsh.num_groups # Grows as the memory is resized
+                    if 0 <= group_idx < num_groups:
                         op_mode = action # "forget" or "merge"
                         if action == "organize_all": op_mode = "all" # "all" triggers both forget and merge
                         self.memory_cache.organize_memory_group(group_idx, mode=op_mode)
                     else:
-                        print(f"Invalid group index. Must be between 0 and {self.lsh.num_groups-1}.")
+                        print(f"Invalid group index. Must be between 0 and {num_groups-1}.")
                 except ValueError:
                     print("Invalid group index. Please enter a number.")
             else:
@@ -388,12 +2640,12 @@ class TiMSystem:
 
 
 # --- Demo Application Runner ---
-def run_demo():
+def run_demo(memory_dir: str | None = None):
     print("🚀 Welcome to the Think-in-Memory (TiM) Demo! 🚀")
     print("This demo simulates the TiM framework for LLMs with long-term memory.")
     print("Key features: Storing 'inductive thoughts', LSH-based grouping, recalling, post-thinking, and memory organization (insert, forget, merge).")
     
-    tim_system = TiMSystem()
+    tim_system = TiMSystem(memory_dir=memory_dir, verbose=True)
 
     # Simulate some initial interactions to pre-populate the memory.
     # These are based on examples from Figure 2, Figure 3, Figure 4, and Figure 5 in the paper.
@@ -419,13 +2671,9 @@ def run_demo():
         ("What is the capital of France?", "Paris.")
     ]
 
-    for q, r_text in initial_interactions:
-        print(f"Simulating Q: {q}, R: {r_text}")
-        # Generate thought directly for pre-population, bypassing full process_query
-        thought = tim_system.llm_agent.generate_inductive_thought(q, r_text)
-        if thought and not thought.startswith("Concluded: Standard Response"):
-            tim_system.memory_cache.insert_thought(thought)
-            
+    # Generate thoughts directly for pre-population, bypassing full process_query
+    tim_system.ingest_interactions(initial_interactions)
+
     tim_system.memory_cache.display_memory() # Show initial memory state
     
     print("\n--- 🎤 Starting Interactive Demo ---")
@@ -437,6 +2685,7 @@ def run_demo():
             continue
         if user_input.lower() == 'quit':
             print("👋 Exiting TiM Demo. Goodbye!")
+            tim_system.close()
             break
         if user_input.lower() == 'memory':
             tim_system.manage_memory_interactive()
@@ -446,4 +2695,5 @@ def run_demo():
         tim_system.process_query(user_input)
 
 if __name__ == "__main__":
-    run_demo()
+    # Optional argument: a directory to persist memory in across runs.
+    run_demo(sys.argv[1] if len(sys.argv) > 1 else None)
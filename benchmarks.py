@@ -0,0 +1,856 @@
+"""
+Micro-benchmarks for the TiM demo components, and an end-to-end suite.
+
+Run a single benchmark with, for example:
+    python benchmarks.py lsh --thoughts 100000 --groups 64
+or the whole suite, with JSON results to compare between runs:
+    python benchmarks.py suite --output results.json --baseline previous.json
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import gc
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource # Peak RSS; not available on Windows
+except ImportError:
+    resource = None
+
+from TiMSystem import (CachedEmbeddingProvider, HashingEmbeddingModel, MemoryCache, MemoryLog, MockLLMAgent,
+                       RandomProjectionLSH, SimpleLSH, TiMSystem, logger)
+
+# Vocabulary for synthetic thoughts, loosely following the patterns the mock agent produces.
+_SUBJECTS = ["John", "Mike", "Alice", "Bob", "Carol", "Dave", "Eve", "Frank", "Grace", "Heidi"]
+_ROLES = ["actor", "director", "writer", "teacher", "doctor", "engineer", "painter", "pilot"]
+_COUNTRIES = ["China", "France", "Japan", "Brazil", "Kenya", "Canada", "Egypt", "India"]
+_CITIES = ["Beijing", "Paris", "Tokyo", "Brasilia", "Nairobi", "Ottawa", "Cairo", "Delhi"]
+_BOOKS = ["The Little Prince", "Dune", "Emma", "Ulysses", "Beloved", "Hamlet", "Walden"]
+_NUM_TOPICS = 500 # Extra "topic" words that make thoughts distinguishable beyond their template
+
+
+def synthetic_thoughts(count: int, seed: int = 0) -> list[str]:
+    """Generates `count` thought-like sentences from a seeded generator."""
+    rng = random.Random(seed)
+    thoughts = []
+    for i in range(count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            thought = f"{rng.choice(_SUBJECTS)} works as a {rng.choice(_ROLES)}"
+        elif kind == 1:
+            thought = f"The capital of {rng.choice(_COUNTRIES)} is {rng.choice(_CITIES)}"
+        else:
+            thought = f"Recommend book is \"{rng.choice(_BOOKS)}\""
+        # The topic word gives recall something to discriminate on; the note keeps every thought distinct.
+        thoughts.append(f"{thought} about topic{rng.randrange(_NUM_TOPICS)} Note {i}.")
+    return thoughts
+
+
+def synthetic_queries(thoughts: list[str], count: int, seed: int = 0) -> list[str]:
+    """Builds queries from stored thoughts by dropping their unique note (so they are near, not exact, matches)."""
+    rng = random.Random(seed)
+    return [rng.choice(thoughts).rsplit(" Note ", 1)[0] for _ in range(count)]
+
+
+def synthetic_interactions(count: int, seed: int = 0):
+    """Yields `count` (query, response) pairs that hit the mock agent's thought patterns."""
+    rng = random.Random(seed)
+    for i in range(count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            yield "What else does John do?", f"John works as a {rng.choice(_ROLES)} (note {i})."
+        elif kind == 1:
+            yield f"What is the capital of {rng.choice(_COUNTRIES)}?", f"{rng.choice(_CITIES)} {i}."
+        else:
+            yield "Do you have any book recommendations for me?", f'I recommend "{rng.choice(_BOOKS)} {i}".'
+
+
+def synthetic_conversation(count: int, seed: int = 0):
+    """
+    Yields `count` (query, response) turns of a realistic, seeded conversation stream covering every
+    pattern generate_inductive_thought knows: book recommendations and opinions, capitals (including
+    the contradictory and "old version" facts that forget removes), "works as" roles that merge
+    merges, and small talk that produces no thought. Entities grow with `count`, so most turns
+    yield a new thought and every entity comes up several times.
+    """
+    rng = random.Random(seed)
+    num_entities = max(10, count // 20)
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15: # Recommendation: 'Recommend book is "<book>".'
+            book = f"{rng.choice(_BOOKS)} {rng.randrange(num_entities)}"
+            yield "Do you have any book recommendations for me?", f'I recommend "{book}".'
+        elif roll < 0.25: # Opinion on a recommendation: '"<book>" is interesting.'
+            book = f"{rng.choice(_BOOKS)} {rng.randrange(num_entities)}"
+            opinion = "is interesting" if rng.random() < 0.7 else "is with stunning visuals"
+            yield f'How is "{book}"?', f'"{book}" {opinion}.'
+        elif roll < 0.45: # Capital: "The capital of <country> is <city>."
+            country = f"{rng.choice(_COUNTRIES)}{rng.randrange(num_entities)}"
+            yield f"What is the capital of {country}?", f"{rng.choice(_CITIES)} {rng.randrange(num_entities)}."
+        elif roll < 0.50: # Contradictions and outdated facts, as in Figure 4
+            if rng.random() < 0.5:
+                yield "What is the capital of China?", rng.choice(["Beijing.", "Shanghai."])
+            else:
+                country = f"{rng.choice(_COUNTRIES)}{rng.randrange(num_entities)}"
+                yield (f"What was another capital of {country}, historically?",
+                       f"{rng.choice(_CITIES)} {i} is an old version capital of {country}.")
+        elif roll < 0.60: # John's roles, as in Figure 5
+            yield "What else does John do?", f"John works as a {rng.choice(['actor', 'director', 'writer'])}."
+        elif roll < 0.90: # Roles of other people: "Concluded: <person> works as a <role>."
+            person = f"{rng.choice(_SUBJECTS)}{rng.randrange(num_entities)}"
+            yield f"What does {person} do?", f"{person} works as a {rng.choice(_ROLES)} since {1950 + i % 70}."
+        else: # Small talk: the agent answers without memory and stores nothing
+            yield f"How are you today ({i})?", "Standard Response."
+
+
+def synthetic_conversation_queries(count: int, seed: int = 0) -> list[str]:
+    """Recall queries about the entities of synthetic_conversation(count, seed)."""
+    rng = random.Random(seed + 1)
+    num_entities = max(10, count // 20)
+    queries = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.3:
+            queries.append(f"Any book recommendations like {rng.choice(_BOOKS)} {rng.randrange(num_entities)}?")
+        elif roll < 0.6:
+            queries.append(f"What is the capital of {rng.choice(_COUNTRIES)}{rng.randrange(num_entities)}?")
+        else:
+            queries.append(f"What does {rng.choice(_SUBJECTS)}{rng.randrange(num_entities)} do?")
+    return queries
+
+
+def synthetic_group(count: int, seed: int = 0) -> list[str]:
+    """A memory group of `count` distinct thoughts that the mock agent's forget and merge rules act on."""
+    rng = random.Random(seed)
+    num_people = max(1, count // 8) # About 8 thoughts per person, so roles merge
+    group = []
+    for i in range(count):
+        kind = rng.randrange(4)
+        if kind < 2:
+            group.append(f"Person{rng.randrange(num_people)} works as a {rng.choice(_ROLES)} {i}.")
+        elif kind == 2:
+            book = f"{rng.choice(_BOOKS)} {rng.randrange(count)}"
+            group.append(f"Recommend book is \"{book}\"." if rng.random() < 0.5 else f"\"{book}\" is interesting.")
+        else:
+            marker = " (old version)" if rng.random() < 0.1 else ""
+            group.append(f"The capital of {rng.choice(_COUNTRIES)} is {rng.choice(_CITIES)} {i}{marker}.")
+    group.extend(["The capital of China is Beijing.", "The capital of China is Shanghai."])
+    return list(dict.fromkeys(group))
+
+
+def _bucket_balance(indices: np.ndarray, num_groups: int) -> dict[str, float]:
+    """Summarizes how evenly hash indices spread across groups (1.0 is perfectly even)."""
+    counts = np.bincount(indices, minlength=num_groups)
+    mean = counts.mean()
+    return {
+        "empty_groups": int((counts == 0).sum()),
+        "max_over_mean": float(counts.max() / mean),
+        "coeff_of_variation": float(counts.std() / mean),
+    }
+
+
+def bench_lsh(num_thoughts: int, num_groups: int, embedding_dim: int, seed: int):
+    """
+    Compares SimpleLSH (modulo over the ASCII-sum embedding, hashed one at a time)
+    with RandomProjectionLSH (dense embeddings, hashed as one batch).
+    Embedding time is excluded so only the hashing itself is measured.
+    """
+    texts = synthetic_thoughts(num_thoughts, seed=seed)
+
+    scalar_agent = MockLLMAgent()
+    simple_lsh = SimpleLSH(num_groups=num_groups)
+    scalar_embeddings = [scalar_agent.get_embedding(t) for t in texts]
+    start = time.perf_counter()
+    simple_indices = np.array([simple_lsh.get_hash_index(e) for e in scalar_embeddings])
+    simple_elapsed = time.perf_counter() - start
+
+    dense_agent = MockLLMAgent(embedding_dim=embedding_dim)
+    rp_lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=embedding_dim, seed=seed)
+    dense_embeddings = dense_agent.get_embeddings(texts)
+    start = time.perf_counter()
+    rp_indices = rp_lsh.get_hash_indices(dense_embeddings)
+    rp_elapsed = time.perf_counter() - start
+
+    # Locality check: thoughts that differ only in their "Note" suffix should share a group.
+    pair_texts = [t.rsplit(" Note ", 1)[0] for t in texts[:1000]]
+    scalar_same = np.mean([simple_lsh.get_hash_index(scalar_agent.get_embedding(t)) == i
+                           for t, i in zip(pair_texts, simple_indices[:1000])])
+    rp_same = np.mean(rp_lsh.get_hash_indices(dense_agent.get_embeddings(pair_texts)) == rp_indices[:1000])
+
+    print(f"LSH benchmark: {num_thoughts} thoughts, {num_groups} groups, dim {embedding_dim}")
+    for name, elapsed, indices, same in [("SimpleLSH", simple_elapsed, simple_indices, scalar_same),
+                                         ("RandomProjectionLSH", rp_elapsed, rp_indices, rp_same)]:
+        balance = _bucket_balance(indices, num_groups)
+        print(f"  {name:<20} {num_thoughts / elapsed:>14,.0f} hashes/sec | "
+              f"max/mean {balance['max_over_mean']:.2f} | CV {balance['coeff_of_variation']:.2f} | "
+              f"empty {balance['empty_groups']} | near-duplicate collisions {same:.0%}")
+
+
+def _exact_top_k_threshold(query: str, thoughts_words: list[set[str]], top_k: int) -> int:
+    """Keyword-overlap score of the k-th best thought over the whole memory (the brute-force answer)."""
+    query_words = set(query.lower().split())
+    scores = sorted((len(words & query_words) for words in thoughts_words), reverse=True)
+    return scores[min(top_k, len(scores)) - 1]
+
+
+def bench_recall(num_thoughts: int, num_groups: int, num_queries: int, top_k: int,
+                 tables: list[int], probes: list[int], seed: int):
+    """
+    Recall@k vs latency for multi-table / multi-probe recall.
+    Keyword-overlap scores tie a lot, so a returned thought counts as a hit when its score
+    is at least the score of the true k-th best thought in the whole memory.
+    """
+    texts = synthetic_thoughts(num_thoughts, seed=seed)
+    queries = synthetic_queries(texts, num_queries, seed=seed + 1)
+    thoughts_words = [set(t.lower().split()) for t in texts]
+    thresholds = [_exact_top_k_threshold(q, thoughts_words, top_k) for q in queries]
+
+    print(f"Recall benchmark: {num_thoughts} thoughts, {num_groups} groups, {num_queries} queries, k={top_k}")
+    print(f"  {'tables':>6} {'probes':>6} {'recall@k':>9} {'candidates':>11} {'latency (ms)':>13}")
+    for num_tables in tables:
+        for num_probes in probes:
+            agent = MockLLMAgent(embedding_dim=64)
+            lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=64, seed=seed)
+            cache = MemoryCache(lsh, agent, num_tables=num_tables, num_probes=num_probes)
+            for text in texts:
+                cache.insert_thought(text)
+            hits = 0
+            candidates = 0
+            start = time.perf_counter()
+            for query, threshold in zip(queries, thresholds):
+                recalled = cache.recall_thoughts(query, top_k=top_k)
+                query_words = set(query.lower().split())
+                hits += sum(len(set(t.lower().split()) & query_words) >= threshold for t in recalled)
+            elapsed = time.perf_counter() - start
+            for query in queries: # Distinct thoughts in the probed groups
+                probed = cache._probe_groups(agent.get_embedding(query))
+                candidates += len(np.unique(np.concatenate([table.groups[g_idx].rows for table, g_idx in probed])))
+            print(f"  {num_tables:>6} {num_probes:>6} {hits / (top_k * num_queries):>9.1%} "
+                  f"{candidates / num_queries:>11.0f} {elapsed / num_queries * 1000:>13.3f}")
+
+
+def bench_ingest(num_interactions: int, num_groups: int, batch_size: int, seed: int):
+    """Interactions/sec of one-at-a-time insertion (the old pre-population loop) vs ingest_interactions."""
+    tim = TiMSystem(num_groups=num_groups, seed=seed)
+    start = time.perf_counter()
+    for query, response in synthetic_interactions(num_interactions, seed=seed):
+        thought = tim.llm_agent.generate_inductive_thought(query, response)
+        if thought and not thought.startswith("Concluded: Standard Response"):
+            tim.memory_cache.insert_thought(thought)
+    loop_elapsed = time.perf_counter() - start
+
+    tim = TiMSystem(num_groups=num_groups, seed=seed)
+    stats = tim.ingest_interactions(synthetic_interactions(num_interactions, seed=seed), batch_size=batch_size)
+
+    print(f"Ingest benchmark: {num_interactions} interactions, {num_groups} groups, batch size {batch_size}")
+    print(f"  {'one at a time':<15} {num_interactions / loop_elapsed:>12,.0f} interactions/sec")
+    print(f"  {'bulk':<15} {stats['interactions_per_sec']:>12,.0f} interactions/sec")
+
+
+def bench_embeddings(num_lookups: int, num_distinct: int, cache_sizes: list[int], latency: float, seed: int):
+    """
+    Embedding cache hit rate and lookup throughput on a Zipf-like stream of repeated texts,
+    against a local stand-in model that sleeps `latency` seconds per round-trip.
+    """
+    texts = synthetic_thoughts(num_distinct, seed=seed)
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(num_distinct)]
+    stream = rng.choices(texts, weights=weights, k=num_lookups)
+
+    print(f"Embedding cache benchmark: {num_lookups} lookups over {num_distinct} distinct texts, "
+          f"model latency {latency * 1000:.1f} ms")
+    print(f"  {'cache size':>10} {'hit rate':>9} {'model calls':>12} {'lookups/sec':>12}")
+    for cache_size in cache_sizes:
+        model = HashingEmbeddingModel(embedding_dim=64, latency=latency)
+        provider = CachedEmbeddingProvider(model, max_size=cache_size)
+        start = time.perf_counter()
+        for text in stream:
+            provider.get_embedding(text)
+        elapsed = time.perf_counter() - start
+        print(f"  {cache_size:>10} {provider.stats()['hit_rate']:>9.1%} {model.calls:>12} "
+              f"{num_lookups / elapsed:>12,.0f}")
+
+
+def bench_persistence(num_thoughts: int, num_groups: int, seed: int):
+    """Time to write a snapshot, to reopen it (memory-mapped) and to serve the first recall."""
+    texts = synthetic_thoughts(num_thoughts, seed=seed)
+    directory = tempfile.mkdtemp(prefix="tim-bench-")
+    try:
+        def open_cache():
+            lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=64, seed=seed)
+            return MemoryCache(lsh, MockLLMAgent(embedding_dim=64), log=MemoryLog(directory, snapshot_every=0))
+
+        cache = open_cache()
+        cache.insert_thoughts(texts)
+        start = time.perf_counter()
+        cache.log.snapshot(cache)
+        snapshot_elapsed = time.perf_counter() - start
+        cache.close()
+
+        start = time.perf_counter()
+        cache = open_cache()
+        open_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        cache.recall_thoughts(synthetic_queries(texts, 1, seed=seed)[0])
+        recall_elapsed = time.perf_counter() - start
+        cache.close()
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(directory) for name in names)
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"Persistence benchmark: {num_thoughts} thoughts, {num_groups} groups, {size / 2**20:.1f} MiB on disk")
+    print(f"  snapshot write {snapshot_elapsed:.3f}s | reopen {open_elapsed:.3f}s | first recall {recall_elapsed * 1000:.1f} ms")
+
+
+def bench_resize(num_thoughts: int, num_groups: int, max_load_factor: float, rehash_steps: list[int], seed: int):
+    """Per-insert latency while the memory grows: migrating everything at once vs a few thoughts per insert."""
+    texts = synthetic_thoughts(num_thoughts, seed=seed)
+    print(f"Resize benchmark: {num_thoughts} single inserts from {num_groups} groups, max load factor {max_load_factor}")
+    for rehash_step in rehash_steps:
+        lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=64, seed=seed)
+        cache = MemoryCache(lsh, MockLLMAgent(embedding_dim=64), max_load_factor=max_load_factor,
+                            rehash_step=rehash_step)
+        latencies = np.empty(num_thoughts)
+        for i, text in enumerate(texts):
+            start = time.perf_counter()
+            cache.insert_thought(text)
+            latencies[i] = time.perf_counter() - start
+        label = "stop-the-world" if rehash_step >= num_thoughts else f"{rehash_step} thoughts/insert"
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+        print(f"  {label:>20}: {cache.lsh.num_groups:5d} groups at the end | p50 {p50:7.1f} us | "
+              f"p99 {p99:7.1f} us | worst {latencies.max() * 1e3:8.2f} ms | total {latencies.sum():.2f}s")
+
+
+def bench_organize(sizes: list[int], seed: int):
+    """Time of the mock agent's forget and merge passes over one group, for growing group sizes."""
+    agent = MockLLMAgent()
+    print("Organize benchmark: forget + merge of a single group")
+    for size in sizes:
+        group = synthetic_group(size, seed=seed)
+        start = time.perf_counter()
+        forgotten = agent.identify_thoughts_to_forget(group)
+        forget_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = agent.merge_thoughts_in_group(group)
+        merge_elapsed = time.perf_counter() - start
+        per_thought = (forget_elapsed + merge_elapsed) / len(group) * 1e9
+        print(f"  {len(group):9d} thoughts: forget {forget_elapsed * 1000:9.1f} ms ({len(forgotten)} forgotten) | "
+              f"merge {merge_elapsed * 1000:9.1f} ms ({len(group) - len(merged)} merged away) | "
+              f"{per_thought:6.0f} ns/thought")
+
+
+async def _run_sessions(system: TiMSystem, num_sessions: int, turns: int, seed: int) -> list[float]:
+    """Runs num_sessions concurrent conversations of `turns` queries each; returns every turn's latency."""
+    latencies = []
+
+    async def session(user_idx: int):
+        rng = random.Random(seed * 1_000_003 + user_idx)
+        for _ in range(turns):
+            query = f"What else does {rng.choice(_SUBJECTS)} do about topic{rng.randrange(_NUM_TOPICS)}?"
+            start = time.perf_counter()
+            await system.process_query_async(query, user_id=f"user{user_idx}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(session(user_idx) for user_idx in range(num_sessions)))
+    return latencies
+
+
+def bench_sessions(session_counts: list[int], turns: int, llm_latency: float, seed: int):
+    """Load test of process_query_async: per-turn latency and throughput as concurrent sessions grow."""
+    print(f"Sessions benchmark: {turns} turns per session, simulated LLM latency {llm_latency * 1000:.0f} ms per call")
+    for num_sessions in session_counts:
+        system = TiMSystem(seed=seed, llm_latency=llm_latency)
+        start = time.perf_counter()
+        latencies = asyncio.run(_run_sessions(system, num_sessions, turns, seed))
+        elapsed = time.perf_counter() - start
+        system.close()
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"  {num_sessions:6d} sessions: p50 {p50:8.1f} ms | p99 {p99:8.1f} ms | "
+              f"{len(latencies) / elapsed:9,.0f} turns/sec")
+
+
+def bench_tracing(num_thoughts: int, num_queries: int, seed: int):
+    """Cost of verbose tracing: inserts and recalls with tracing off vs on (written to /dev/null)."""
+    texts = synthetic_thoughts(num_thoughts, seed=seed)
+    queries = synthetic_queries(texts, num_queries, seed=seed)
+    print(f"Tracing benchmark: {num_thoughts} inserts, {num_queries} recalls")
+    for traced in (False, True):
+        with open(os.devnull, "w") as devnull:
+            handler = logging.StreamHandler(devnull)
+            level = logger.level
+            if traced:
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+            try:
+                lsh = RandomProjectionLSH(num_groups=64, embedding_dim=64, seed=seed)
+                cache = MemoryCache(lsh, MockLLMAgent(embedding_dim=64), max_load_factor=64)
+                start = time.perf_counter()
+                for text in texts:
+                    cache.insert_thought(text)
+                for query in queries:
+                    cache.recall_thoughts(query)
+                elapsed = time.perf_counter() - start
+            finally:
+                logger.removeHandler(handler)
+                logger.setLevel(level)
+        summary = cache.metrics.summary()
+        print(f"  tracing {'on ' if traced else 'off'}: {(num_thoughts + num_queries) / elapsed:9,.0f} ops/sec | "
+              f"insert p50 <= {summary['tim_insert_seconds']['p50'] * 1e6:5.0f} us | "
+              f"recall p50 <= {summary['tim_recall_seconds']['p50'] * 1e6:5.0f} us")
+
+
+def _latency_stats(latencies: list[float]) -> dict[str, float]:
+    """Throughput and latency percentiles (in microseconds) of a list of per-operation seconds."""
+    if not latencies:
+        return {"ops": 0}
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    total = float(np.sum(latencies))
+    return {"ops": len(latencies), "ops_per_sec": len(latencies) / total if total else float("inf"),
+            "p50_us": float(p50), "p99_us": float(p99), "max_us": float(np.max(latencies)) * 1e6}
+
+
+def _suite_run(num_thoughts: int, samples: int, organize_groups: int, seed: int) -> dict:
+    """One suite measurement at one memory size (run in a fresh process, so peak RSS is per size)."""
+    tim = TiMSystem(num_groups=64, seed=seed)
+    cache = tim.memory_cache
+    stream = synthetic_conversation(2 * num_thoughts, seed=seed)
+    start = time.perf_counter()
+    num_interactions = 0
+    while len(cache.store) < num_thoughts:
+        batch = list(itertools.islice(stream, min(1024, max(1, num_thoughts - len(cache.store)))))
+        if not batch:
+            break
+        num_interactions += tim.ingest_interactions(batch)["interactions"]
+    cache.finish_resize()
+    ingest_elapsed = time.perf_counter() - start
+    result = {"thoughts": len(cache.store), "groups": cache.lsh.num_groups,
+              "ingest": {"interactions": num_interactions, "seconds": ingest_elapsed,
+                         "thoughts_per_sec": len(cache.store) / ingest_elapsed}}
+
+    latencies = []
+    for query in synthetic_conversation_queries(samples, seed=seed):
+        start = time.perf_counter()
+        cache.recall_thoughts(query)
+        latencies.append(time.perf_counter() - start)
+    result["recall"] = _latency_stats(latencies)
+    summary = cache.metrics.summary()["counters"]
+    result["recall"]["hit_rate"] = summary.get("tim_recall_hits_total", 0) / max(1, summary.get("tim_recalls_total", 0))
+
+    thoughts = [thought for thought in tim.llm_agent.generate_inductive_thoughts(
+        list(synthetic_conversation(samples, seed=seed + 1))) if not thought.startswith("Concluded: Standard")]
+    latencies = []
+    for thought in thoughts:
+        start = time.perf_counter()
+        cache.insert_thought(thought)
+        latencies.append(time.perf_counter() - start)
+    result["insert"] = _latency_stats(latencies)
+
+    cache.finish_resize()
+    latencies = []
+    organized_thoughts = 0
+    for group_idx in cache.dirty_groups[:organize_groups]:
+        organized_thoughts += len(cache.memory[group_idx])
+        start = time.perf_counter()
+        cache.organize_memory_group(group_idx, verbose=False)
+        latencies.append(time.perf_counter() - start)
+    result["organize"] = _latency_stats(latencies)
+    if latencies:
+        result["organize"]["thoughts_per_sec"] = organized_thoughts / sum(latencies)
+
+    if resource is not None: # ru_maxrss is in KiB on Linux, bytes on macOS
+        scale = 1 if platform.system() == "Darwin" else 1024
+        result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    return result
+
+
+def bench_suite(sizes: list[int], samples: int, organize_groups: int, seed: int, output: str,
+                baseline: str | None):
+    """
+    Reproducible end-to-end suite: for each memory size, fills a TiMSystem from the seeded
+    conversation workload and measures ingest, insert, recall and organize throughput and latency
+    plus peak memory. Results are written to `output` as JSON and compared with `baseline` if given.
+    """
+    results = {"meta": {"seed": seed, "samples": samples, "organize_groups": organize_groups,
+                        "python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "sizes": []}
+    print(f"Benchmark suite: seed {seed}, {samples} samples per operation")
+    print(f"  {'thoughts':>9} {'ingest/s':>9} {'insert p50/p99 us':>18} {'recall p50/p99 us':>18} "
+          f"{'hit rate':>8} {'organize/s':>10} {'peak MB':>8}")
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(_suite_run, size, samples, organize_groups, seed).result()
+        results["sizes"].append(result)
+        insert, recall, organize = result["insert"], result["recall"], result["organize"]
+        print(f"  {result['thoughts']:>9} {result['ingest']['thoughts_per_sec']:>9,.0f} "
+              f"{insert['p50_us']:>8.0f}/{insert['p99_us']:<9.0f} {recall['p50_us']:>8.0f}/{recall['p99_us']:<9.0f} "
+              f"{recall['hit_rate']:>8.1%} {organize.get('thoughts_per_sec', 0):>10,.0f} "
+              f"{result.get('peak_rss_mb', float('nan')):>8.0f}")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if baseline is not None:
+        _compare_suite(baseline, results)
+
+
+def _compare_suite(baseline_path: str, results: dict):
+    """Prints current/baseline ratios of the main throughput and latency figures, per memory size."""
+    with open(baseline_path) as f:
+        baseline = {entry["thoughts"]: entry for entry in json.load(f)["sizes"]}
+    figures = [("ingest", "thoughts_per_sec"), ("insert", "p99_us"), ("recall", "p50_us"),
+               ("recall", "p99_us"), ("organize", "thoughts_per_sec")]
+    print(f"Compared with {baseline_path} (current / baseline):")
+    for entry in results["sizes"]:
+        # Thought counts can differ slightly between versions; match the nearest baseline size.
+        nearest = min(baseline, key=lambda size: abs(size - entry["thoughts"]), default=None)
+        if nearest is None:
+            continue
+        ratios = []
+        for section, key in figures:
+            current, previous = entry[section].get(key), baseline[nearest][section].get(key)
+            if current is not None and previous:
+                ratios.append(f"{section} {key} {current / previous:.2f}x")
+        print(f"  {entry['thoughts']:>9}: " + " | ".join(ratios))
+
+
+def bench_parallel_organize(num_thoughts: int, worker_counts: list[int], batch_size: int, seed: int):
+    """Speedup of organize_all_groups with a growing process pool, on identical synthetic memories."""
+    print(f"Parallel organize benchmark: {num_thoughts} thoughts, {os.cpu_count()} CPU(s)")
+    baseline = None
+    for workers in worker_counts:
+        tim = TiMSystem(num_groups=64, seed=seed)
+        stream = synthetic_conversation(2 * num_thoughts, seed=seed)
+        while len(tim.memory_cache.store) < num_thoughts:
+            tim.ingest_interactions(itertools.islice(stream, 4096))
+        tim.memory_cache.PARALLEL_MIN_THOUGHTS = 0 # Use the pool whatever the size, to measure it
+        stats = tim.memory_cache.organize_all_groups(workers=workers, batch_size=batch_size)
+        if baseline is None:
+            baseline = stats["seconds"]
+            # Share of the serial sweep spent in forget/merge (the part that runs in the workers)
+            summary = tim.metrics.summary()
+            planned = sum(summary[name]["mean"] * summary[name]["count"]
+                          for name in ("tim_forget_seconds", "tim_merge_seconds") if name in summary)
+            print(f"  forget/merge is {planned / stats['seconds']:.0%} of the serial sweep")
+        print(f"  {stats['workers']:3d} worker(s): {stats['groups']} groups ({stats['changed']} changed) in "
+              f"{stats['seconds']:7.3f}s | speedup {baseline / stats['seconds']:5.2f}x")
+
+
+def bench_footprint(num_thoughts: int, num_groups: int, similarities: list[str], num_queries: int, seed: int):
+    """
+    Bytes per stored thought (everything the cache allocates, traced by tracemalloc) and recall
+    latency for each stage-2 similarity. The embedding cache is disabled, so the figures only
+    count what the memory itself keeps per thought.
+    """
+    print(f"Footprint benchmark: {num_thoughts} thoughts, {num_groups} groups, {num_queries} queries")
+    print(f"  {'similarity':<10} {'bytes/thought':>14} {'recall (ms)':>12}")
+    for similarity in similarities:
+        gc.collect()
+        tracemalloc.start()
+        texts = synthetic_thoughts(num_thoughts, seed=seed)
+        queries = synthetic_queries(texts, num_queries, seed=seed + 1)
+        agent = MockLLMAgent(embedding_dim=64)
+        lsh = RandomProjectionLSH(num_groups=num_groups, embedding_dim=64, seed=seed)
+        cache = MemoryCache(lsh, agent, embedder=CachedEmbeddingProvider(agent, max_size=0), similarity=similarity)
+        for start in range(0, len(texts), 4096):
+            cache.insert_thoughts(texts[start:start + 4096])
+        del texts
+        start = time.perf_counter()
+        for query in queries: # Recall also builds the structures it searches (e.g. inverted indexes)
+            cache.recall_thoughts(query)
+        elapsed = time.perf_counter() - start
+        del queries
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"  {similarity:<10} {size / num_thoughts:>14,.0f} {elapsed / num_queries * 1000:>12.3f}")
+        del cache
+
+
+def bench_recall_cache(num_thoughts: int, num_steps: int, num_distinct: int, num_tables: int, similarity: str,
+                       seed: int):
+    """
+    Hit rate and speedup of the recall cache on a conversation that keeps repeating questions, with
+    inserts, forgets and merges in between. The same workload runs on a memory without recall cache,
+    and every recall result is compared: a stale cached result would show up as a mismatch.
+    """
+    systems = []
+    for recall_cache_size in (10_000, 0):
+        tim = TiMSystem(num_groups=64, seed=seed, num_tables=num_tables, similarity=similarity,
+                        recall_cache_size=recall_cache_size)
+        tim.ingest_interactions(synthetic_conversation(num_thoughts, seed=seed))
+        systems.append(tim)
+    queries = synthetic_conversation_queries(num_distinct, seed=seed)
+    turns = synthetic_conversation(num_steps, seed=seed + 1)
+    rng = random.Random(seed)
+    elapsed = [0.0, 0.0]
+    hit_elapsed = 0.0 # Part of elapsed[0] spent in recalls answered from the cache
+    mismatches = recalls = inserts = organizations = 0
+    for _ in range(num_steps):
+        roll = rng.random()
+        if roll < 0.8:
+            query = rng.choice(queries)
+            results = []
+            hits = systems[0].memory_cache.recall_cache.hits
+            for i, tim in enumerate(systems):
+                start = time.perf_counter()
+                results.append(tim.memory_cache.recall_thoughts(query))
+                elapsed[i] += time.perf_counter() - start
+                if i == 0 and systems[0].memory_cache.recall_cache.hits > hits:
+                    hit_elapsed += time.perf_counter() - start
+            mismatches += results[0] != results[1]
+            recalls += 1
+        elif roll < 0.97:
+            thought = systems[0].llm_agent.generate_inductive_thought(*next(turns))
+            if thought and not thought.startswith("Concluded: Standard Response"):
+                for tim in systems:
+                    tim.memory_cache.insert_thought(thought)
+                inserts += 1
+        else:
+            dirty = systems[0].memory_cache.dirty_groups
+            if dirty:
+                group_idx = rng.choice(dirty)
+                for tim in systems:
+                    tim.memory_cache.organize_memory_group(group_idx, verbose=False)
+                organizations += 1
+
+    stats = systems[0].memory_cache.recall_cache.stats()
+    counters = systems[0].metrics.summary()["counters"]
+    print(f"Recall cache benchmark: {num_thoughts} interactions, {num_distinct} distinct queries, "
+          f"{num_tables} table(s), {similarity} similarity")
+    print(f"  {recalls} recalls, {inserts} inserts, {organizations} organizations "
+          f"({counters.get('tim_forgotten_total', 0):.0f} thoughts forgotten)")
+    print(f"  hit rate {stats['hit_rate']:.1%} ({stats['stale']} stale entries dropped) | "
+          f"mismatches vs uncached: {mismatches}")
+    print(f"  mean recall {elapsed[1] / recalls * 1e6:.1f} us uncached -> {elapsed[0] / recalls * 1e6:.1f} us cached "
+          f"({elapsed[1] / elapsed[0]:.1f}x); cache hits take {hit_elapsed / max(1, stats['hits']) * 1e6:.1f} us, "
+          f"misses {(elapsed[0] - hit_elapsed) / max(1, stats['misses']) * 1e6:.1f} us")
+    if mismatches:
+        raise SystemExit(f"{mismatches} cached recall(s) differed from an uncached recall.")
+
+
+def _eviction_run(policy: str, num_steps: int, capacity: int | None, group_capacity: int | None,
+                  num_entities: int, checkpoints: int, seed: int) -> dict:
+    """
+    One run of the bench_eviction workload. With checkpoints > 0 the run is traced by tracemalloc
+    (memory at each checkpoint); otherwise it is timed.
+    """
+    traced = checkpoints > 0
+    if traced:
+        gc.collect()
+        tracemalloc.start()
+    tim = TiMSystem(num_groups=64, seed=seed, num_probes=4, embedding_cache_size=0, recall_cache_size=0,
+                    capacity=capacity, group_capacity=group_capacity, eviction=policy)
+    rng = random.Random(seed)
+    sizes = []
+    insert_time = recall_time = 0.0
+    inserts = recalls = answered = 0
+    for step in range(num_steps):
+        rank = int(rng.paretovariate(0.5)) - 1 # Heavy-tailed: rank k is drawn about k**-1.5 as often as rank 0
+        if rank >= num_entities:
+            rank = rng.randrange(num_entities)
+        phase = step * 4 // num_steps # The popular entities move on every quarter of the run
+        entity = (rank + phase * num_entities // 4) % num_entities
+        country = f"{_COUNTRIES[entity % len(_COUNTRIES)]}{entity}"
+        if rng.random() < 0.5:
+            # One fact per entity: a popular entity's fact is mostly already stored (a duplicate insert)
+            thought = tim.llm_agent.generate_inductive_thought(f"What is the capital of {country}?",
+                                                               f"{_CITIES[entity // 7 % len(_CITIES)]} {entity}.")
+            start = time.perf_counter()
+            tim.memory_cache.insert_thought(thought)
+            insert_time += time.perf_counter() - start
+            inserts += 1
+        else:
+            start = time.perf_counter()
+            recalled = tim.memory_cache.recall_thoughts(f"The capital of {country} is")
+            recall_time += time.perf_counter() - start
+            if step >= num_steps // 2: # Steady state: well past the point where the memory filled up
+                recalls += 1
+                answered += any(f" {country} " in thought for thought in recalled)
+        if traced and (step + 1) % (num_steps // checkpoints) == 0:
+            sizes.append(tracemalloc.get_traced_memory()[0])
+    result = {"thoughts": len(tim.memory_cache.store), "sizes": sizes, "answered": answered / max(1, recalls),
+              "insert": insert_time / max(1, inserts), "recall": recall_time / max(1, num_steps - inserts),
+              "evicted": tim.metrics.summary()["counters"].get("tim_evictions_total", 0)}
+    tim.close()
+    del tim
+    if traced:
+        tracemalloc.stop()
+    return result
+
+
+def bench_eviction(num_steps: int, capacity: int, group_capacity: int | None, num_entities: int,
+                   policies: list[str], checkpoints: int, seed: int):
+    """
+    Steady-state memory and recall quality of a capacity-bounded memory under a long-running
+    workload: half the steps state a capital fact, half ask for one. Entity popularity is Zipf
+    distributed and the popular entities change every quarter of the run, so a policy has to keep
+    the facts that are asked for now. A recall counts as answered if a recalled thought names the
+    asked entity (measured over the second half of the run). Embedding and recall caches are off,
+    so the traced memory is the memory's own. Each policy runs twice, once traced for memory and
+    once untraced for latency; an unbounded memory runs first as the baseline.
+    """
+    print(f"Eviction benchmark: {num_steps} steps, {num_entities} entities, capacity {capacity}"
+          + (f", group capacity {group_capacity}" if group_capacity is not None else ""))
+    print(f"  {'policy':<9} {'thoughts':>9} {'traced MB at each checkpoint':>30} {'answered':>9} "
+          f"{'insert us':>10} {'recall us':>10} {'evicted':>9}")
+    for policy in ["unbounded"] + policies:
+        bounded = policy != "unbounded"
+        options = (capacity if bounded else None, group_capacity if bounded else None, num_entities)
+        eviction = policy if bounded else "lru"
+        memory = _eviction_run(eviction, num_steps, *options, checkpoints, seed)
+        timed = _eviction_run(eviction, num_steps, *options, 0, seed)
+        print(f"  {policy:<9} {timed['thoughts']:>9,} {' '.join(f'{size / 2**20:.1f}' for size in memory['sizes']):>30} "
+              f"{timed['answered']:>9.1%} {timed['insert'] * 1e6:>10.1f} {timed['recall'] * 1e6:>10.1f} "
+              f"{timed['evicted']:>9,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    lsh_parser = subparsers.add_parser("lsh", help="Hashes/sec and bucket balance of the LSH engines.")
+    lsh_parser.add_argument("--thoughts", type=int, default=100_000)
+    lsh_parser.add_argument("--groups", type=int, default=64)
+    lsh_parser.add_argument("--dim", type=int, default=64)
+    lsh_parser.add_argument("--seed", type=int, default=0)
+
+    recall_parser = subparsers.add_parser("recall", help="Recall@k vs latency for multi-table / multi-probe LSH.")
+    recall_parser.add_argument("--thoughts", type=int, default=20_000)
+    recall_parser.add_argument("--groups", type=int, default=64)
+    recall_parser.add_argument("--queries", type=int, default=500)
+    recall_parser.add_argument("--top-k", type=int, default=3)
+    recall_parser.add_argument("--tables", type=int, nargs="+", default=[1, 2, 4])
+    recall_parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4])
+    recall_parser.add_argument("--seed", type=int, default=0)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Throughput of bulk ingestion vs one-at-a-time inserts.")
+    ingest_parser.add_argument("--interactions", type=int, default=50_000)
+    ingest_parser.add_argument("--groups", type=int, default=64)
+    ingest_parser.add_argument("--batch-size", type=int, default=1024)
+    ingest_parser.add_argument("--seed", type=int, default=0)
+
+    embeddings_parser = subparsers.add_parser("embeddings", help="Hit rate and throughput of the embedding cache.")
+    embeddings_parser.add_argument("--lookups", type=int, default=20_000)
+    embeddings_parser.add_argument("--distinct", type=int, default=5_000)
+    embeddings_parser.add_argument("--cache-sizes", type=int, nargs="+", default=[0, 100, 1_000, 10_000])
+    embeddings_parser.add_argument("--latency", type=float, default=0.0005, help="Seconds per model call.")
+    embeddings_parser.add_argument("--seed", type=int, default=0)
+
+    persist_parser = subparsers.add_parser("persist", help="Snapshot write, reopen and first-recall times.")
+    persist_parser.add_argument("--thoughts", type=int, default=200_000)
+    persist_parser.add_argument("--groups", type=int, default=256)
+    persist_parser.add_argument("--seed", type=int, default=0)
+
+    resize_parser = subparsers.add_parser("resize", help="Worst-case insert latency while the memory grows.")
+    resize_parser.add_argument("--thoughts", type=int, default=200_000)
+    resize_parser.add_argument("--groups", type=int, default=8)
+    resize_parser.add_argument("--max-load-factor", type=float, default=64.0)
+    resize_parser.add_argument("--rehash-steps", type=int, nargs="+", default=[1 << 30, 16, 64],
+                               help="Thoughts migrated per insert; a huge value migrates everything at once.")
+    resize_parser.add_argument("--seed", type=int, default=0)
+
+    organize_parser = subparsers.add_parser("organize", help="Forget/merge time for growing group sizes.")
+    organize_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    organize_parser.add_argument("--seed", type=int, default=0)
+
+    sessions_parser = subparsers.add_parser("sessions", help="p50/p99 turn latency vs concurrent async sessions.")
+    sessions_parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100, 1_000])
+    sessions_parser.add_argument("--turns", type=int, default=10)
+    sessions_parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per LLM call.")
+    sessions_parser.add_argument("--seed", type=int, default=0)
+
+    tracing_parser = subparsers.add_parser("tracing", help="Insert/recall throughput with tracing off vs on.")
+    tracing_parser.add_argument("--thoughts", type=int, default=50_000)
+    tracing_parser.add_argument("--queries", type=int, default=5_000)
+    tracing_parser.add_argument("--seed", type=int, default=0)
+
+    suite_parser = subparsers.add_parser("suite", help="End-to-end suite over memory sizes, written as JSON.")
+    suite_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000],
+                              help="Memory sizes in thoughts (10000000 needs about 13 GB of RAM).")
+    suite_parser.add_argument("--samples", type=int, default=2_000, help="Timed inserts and recalls per size.")
+    suite_parser.add_argument("--organize-groups", type=int, default=100, help="Dirty groups organized per size.")
+    suite_parser.add_argument("--seed", type=int, default=0)
+    suite_parser.add_argument("--output", default="benchmark-results.json")
+    suite_parser.add_argument("--baseline", help="Earlier results JSON to compare with.")
+
+    parallel_parser = subparsers.add_parser("parallel", help="Speedup of organize_all_groups with more workers.")
+    parallel_parser.add_argument("--thoughts", type=int, default=500_000)
+    parallel_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parallel_parser.add_argument("--batch-size", type=int, default=50_000)
+    parallel_parser.add_argument("--seed", type=int, default=0)
+
+    footprint_parser = subparsers.add_parser("footprint", help="Bytes per thought and recall latency per similarity.")
+    footprint_parser.add_argument("--thoughts", type=int, default=200_000)
+    footprint_parser.add_argument("--groups", type=int, default=1024)
+    footprint_parser.add_argument("--similarity", nargs="+", default=["keyword", "cosine"],
+                                  choices=["keyword", "cosine"])
+    footprint_parser.add_argument("--queries", type=int, default=2_000)
+    footprint_parser.add_argument("--seed", type=int, default=0)
+
+    recall_cache_parser = subparsers.add_parser(
+        "recall-cache", help="Hit rate, speedup and correctness of the recall result cache.")
+    recall_cache_parser.add_argument("--interactions", type=int, default=50_000)
+    recall_cache_parser.add_argument("--steps", type=int, default=20_000)
+    recall_cache_parser.add_argument("--distinct", type=int, default=500, help="Distinct queries in the workload.")
+    recall_cache_parser.add_argument("--tables", type=int, default=1)
+    recall_cache_parser.add_argument("--similarity", default="keyword", choices=["keyword", "cosine"])
+    recall_cache_parser.add_argument("--seed", type=int, default=0)
+
+    eviction_parser = subparsers.add_parser(
+        "eviction", help="Steady-state memory and recall quality of a capacity-bounded memory per eviction policy.")
+    eviction_parser.add_argument("--steps", type=int, default=100_000)
+    eviction_parser.add_argument("--capacity", type=int, default=2_000)
+    eviction_parser.add_argument("--group-capacity", type=int, default=None)
+    eviction_parser.add_argument("--entities", type=int, default=20_000)
+    eviction_parser.add_argument("--policies", nargs="+", default=["lru", "lfu", "age"], choices=["lru", "lfu", "age"])
+    eviction_parser.add_argument("--checkpoints", type=int, default=5, help="Memory measurements over the run.")
+    eviction_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.benchmark == "lsh":
+        bench_lsh(args.thoughts, args.groups, args.dim, args.seed)
+    elif args.benchmark == "recall":
+        bench_recall(args.thoughts, args.groups, args.queries, args.top_k, args.tables, args.probes, args.seed)
+    elif args.benchmark == "ingest":
+        bench_ingest(args.interactions, args.groups, args.batch_size, args.seed)
+    elif args.benchmark == "embeddings":
+        bench_embeddings(args.lookups, args.distinct, args.cache_sizes, args.latency, args.seed)
+    elif args.benchmark == "persist":
+        bench_persistence(args.thoughts, args.groups, args.seed)
+    elif args.benchmark == "resize":
+        bench_resize(args.thoughts, args.groups, args.max_load_factor, args.rehash_steps, args.seed)
+    elif args.benchmark == "organize":
+        bench_organize(args.sizes, args.seed)
+    elif args.benchmark == "sessions":
+        bench_sessions(args.sessions, args.turns, args.llm_latency, args.seed)
+    elif args.benchmark == "tracing":
+        bench_tracing(args.thoughts, args.queries, args.seed)
+    elif args.benchmark == "parallel":
+        bench_parallel_organize(args.thoughts, args.workers, args.batch_size, args.seed)
+    elif args.benchmark == "footprint":
+        bench_footprint(args.thoughts, args.groups, args.similarity, args.queries, args.seed)
+    elif args.benchmark == "recall-cache":
+        bench_recall_cache(args.interactions, args.steps, args.distinct, args.tables, args.similarity, args.seed)
+    elif args.benchmark == "eviction":
+        bench_eviction(args.steps, args.capacity, args.group_capacity, args.entities, args.policies,
+                       args.checkpoints, args.seed)
+    elif args.benchmark == "suite":
+        bench_suite(args.sizes, args.samples, args.organize_groups, args.seed, args.output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
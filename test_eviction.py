@@ -0,0 +1,64 @@
+"""Tests for capacity-bounded memory: eviction must leave every table and the log consistent."""
+import pytest
+
+from benchmarks import synthetic_conversation
+from TiMSystem import TiMSystem
+
+
+def converse(tim: TiMSystem, count: int, seed: int = 1):
+    """Feeds synthetic conversation turns to the memory, recalling now and then."""
+    for turn, (query, response) in enumerate(synthetic_conversation(count, seed=seed)):
+        thought = tim.llm_agent.generate_inductive_thought(query, response)
+        if thought and not thought.startswith("Concluded: Standard Response"):
+            tim.memory_cache.insert_thought(thought)
+        if turn % 50 == 0:
+            tim.memory_cache.recall_thoughts(query)
+
+
+def table_ids(cache, table) -> set[str]:
+    return {t_id for group in table.groups.values() for t_id in cache.store.ids(group.rows)}
+
+
+def assert_consistent(cache):
+    """Every table (old ones too, mid-resize) only holds stored thoughts, with aligned embeddings."""
+    tables = cache.tables + (cache._old_tables or [])
+    for table in tables:
+        for g_idx, group in table.groups.items():
+            assert all(cache.store._refcounts[group.rows] > 0), f"dangling row in group {g_idx}"
+            assert len(table.vectors[g_idx]) == len(group)
+            for position, row in enumerate(group.rows.tolist()):
+                assert cache._position(table, g_idx, row) is not None, f"row {row} not found in group {g_idx}"
+                if not cache.store.shared(row):
+                    assert table.position(g_idx, row) == position
+            if g_idx in table.postings:
+                postings = table.postings[g_idx]
+                indexed = set(postings.rows[postings.alive].tolist()).union(*postings.pending.values())
+                assert indexed == set(group.rows.tolist()), f"stale postings in group {g_idx}"
+    cache.finish_resize()
+    stored = table_ids(cache, cache.tables[0])
+    assert len(stored) == len(cache.store) and all(t_id in cache.store for t_id in stored)
+    for table in cache.tables[1:]:
+        assert table_ids(cache, table) == stored
+
+
+@pytest.mark.parametrize("capacity", [258, 260, 265, 270])
+def test_eviction_during_resize_with_extra_tables(capacity):
+    # The memory resizes while it is full, so victims are often still in an old extra table.
+    tim = TiMSystem(num_groups=4, num_tables=2, capacity=capacity)
+    converse(tim, 5000)
+    assert len(tim.memory_cache.store) <= capacity
+    assert_consistent(tim.memory_cache)
+
+
+def test_evictions_are_replayed_on_recovery(tmp_path):
+    tim = TiMSystem(num_groups=4, num_tables=2, capacity=260, group_capacity=60, memory_dir=str(tmp_path))
+    tim.memory_log.snapshot_every = 2_000
+    converse(tim, 5000)
+    expected = {g_idx: set(tim.memory_cache.get_group_ids(g_idx)) for g_idx in tim.memory_cache.memory}
+    tim.close()
+
+    reopened = TiMSystem(num_groups=4, num_tables=2, capacity=260, group_capacity=60, memory_dir=str(tmp_path))
+    cache = reopened.memory_cache
+    assert {g_idx: set(cache.get_group_ids(g_idx)) for g_idx in cache.memory} == expected
+    assert_consistent(cache)
+    reopened.close()
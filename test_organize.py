@@ -0,0 +1,55 @@
+"""Tests for organize_all_groups: a parallel sweep must leave the same memory as a serial one."""
+import numpy as np
+import pytest
+
+from benchmarks import synthetic_conversation
+from TiMSystem import TiMSystem
+
+
+def organized_memory(workers: int, **options) -> tuple[dict, dict]:
+    tim = TiMSystem(num_groups=16, **options)
+    tim.ingest_interactions(synthetic_conversation(6000, seed=2))
+    cache = tim.memory_cache
+    stats = cache.organize_all_groups(workers=workers, batch_size=500)
+    rows = np.concatenate([group.rows for group in cache.memory.values()])
+    order = cache.store.ids(rows[np.argsort(cache.store.sequences(rows))])
+    state = {"groups": {g_idx: cache.get_group_thoughts(g_idx) for g_idx in cache.memory},
+             "extra": [{g_idx: sorted(cache.store.ids(group.rows)) for g_idx, group in table.groups.items()}
+                       for table in cache.tables[1:]],
+             "order": order}
+    tim.close()
+    return state, stats
+
+
+@pytest.mark.parametrize("num_tables", [1, 2])
+def test_parallel_sweep_matches_serial(monkeypatch, num_tables):
+    monkeypatch.setattr("TiMSystem.MemoryCache.PARALLEL_MIN_THOUGHTS", 0)
+    serial, serial_stats = organized_memory(1, num_tables=num_tables)
+    parallel, parallel_stats = organized_memory(2, num_tables=num_tables)
+    assert parallel_stats["workers"] == 2 and serial_stats["changed"] > 0
+    assert parallel == serial
+    assert {key: parallel_stats[key] for key in ("groups", "changed", "applied")} == \
+        {key: serial_stats[key] for key in ("groups", "changed", "applied")}
+
+
+def test_small_memory_is_organized_without_a_pool():
+    _, stats = organized_memory(8)
+    assert stats["workers"] == 1
+
+
+def test_merge_into_an_existing_thought_keeps_it_once():
+    # The second merge reproduces the thought the first one left in the group.
+    tim = TiMSystem(num_groups=2)
+    cache = tim.memory_cache
+    for _ in range(2):
+        cache.insert_thought('Recommend book is "X".')
+        cache.insert_thought('"X" is interesting.')
+        cache.organize_all_groups(workers=1)
+    for g_idx in cache.memory:
+        ids = cache.get_group_ids(g_idx)
+        assert len(ids) == len(set(ids))
+    cache.group_capacity = 1
+    for number in range(4):
+        cache.insert_thought(f'"X{number}" is interesting.')
+    assert all(len(group) <= 1 for group in cache.memory.values())
+    tim.close()
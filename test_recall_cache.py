@@ -0,0 +1,55 @@
+"""Tests for the recall cache: a cached recall must return exactly what an uncached one would."""
+import pytest
+
+from benchmarks import synthetic_conversation, synthetic_conversation_queries
+from TiMSystem import MemoryCache, MockLLMAgent, RandomProjectionLSH
+
+
+def twin_caches(**options) -> tuple[MemoryCache, MemoryCache]:
+    """Two identical memories, one with the recall cache and one without."""
+    def make(recall_cache_size: int) -> MemoryCache:
+        agent = MockLLMAgent(embedding_dim=64)
+        return MemoryCache(RandomProjectionLSH(num_groups=4, embedding_dim=64), agent,
+                           recall_cache_size=recall_cache_size, **options)
+    return make(10_000), make(0)
+
+
+def assert_same_recalls(cached: MemoryCache, uncached: MemoryCache, queries: list[str]):
+    # Each query twice, so the second one is served from the cache if it is still valid.
+    for query in queries + queries:
+        assert cached.recall_thoughts(query) == uncached.recall_thoughts(query), query
+
+
+def feed(caches: tuple[MemoryCache, MemoryCache], turns: list[tuple[str, str]]):
+    for cache in caches:
+        for query, response in turns:
+            thought = cache.llm_agent.generate_inductive_thought(query, response)
+            if thought and not thought.startswith("Concluded: Standard Response"):
+                cache.insert_thought(thought)
+
+
+@pytest.mark.parametrize("similarity", ["keyword", "cosine"])
+@pytest.mark.parametrize("num_tables, num_probes", [(1, 1), (2, 2)])
+def test_cached_recall_matches_uncached(similarity, num_tables, num_probes):
+    caches = twin_caches(similarity=similarity, num_tables=num_tables, num_probes=num_probes,
+                         max_load_factor=16.0, capacity=300, group_capacity=120)
+    cached, uncached = caches
+    turns = list(synthetic_conversation(1200, seed=3))
+    queries = synthetic_conversation_queries(40, seed=3)
+    resized = evicted = organized = False
+    for start in range(0, len(turns), 100):
+        # Inserts (which resize the memory and, once full, evict from it).
+        num_groups = cached.lsh.num_groups
+        feed(caches, turns[start:start + 100])
+        resized |= cached.resizing or cached.lsh.num_groups != num_groups
+        evicted |= len(cached.store) == cached.capacity
+        assert_same_recalls(cached, uncached, queries)
+        # Forget and merge every group.
+        if start % 300 == 0:
+            for cache in caches:
+                stats = cache.organize_all_groups(workers=1)
+            organized |= stats["changed"] > 0
+            assert_same_recalls(cached, uncached, queries)
+    assert resized and evicted and organized
+    assert cached.recall_cache.hits > 0
+    assert len(cached.store) == len(uncached.store)
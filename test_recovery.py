@@ -0,0 +1,61 @@
+"""Tests for crash recovery: a torn log tail or an interrupted snapshot must not lose or corrupt the memory."""
+import os
+import shutil
+
+from benchmarks import synthetic_conversation
+from TiMSystem import TiMSystem
+
+
+def memory_state(tim: TiMSystem) -> dict[int, list[str]]:
+    cache = tim.memory_cache
+    return {g_idx: cache.get_group_thoughts(g_idx) for g_idx in cache.memory}
+
+
+def populated(memory_dir: str) -> tuple[TiMSystem, dict[int, list[str]]]:
+    """A memory with a snapshot plus logged operations after it."""
+    tim = TiMSystem(num_groups=8, num_tables=2, memory_dir=memory_dir)
+    tim.ingest_interactions(synthetic_conversation(2000, seed=4))
+    tim.memory_log.snapshot(tim.memory_cache)
+    tim.ingest_interactions(synthetic_conversation(500, seed=5))
+    tim.memory_cache.organize_all_groups(workers=1)
+    return tim, memory_state(tim)
+
+
+def test_torn_log_tail_is_dropped(tmp_path):
+    tim, expected = populated(str(tmp_path))
+    log_path = tim.memory_log._log_path(tim.memory_log.generation)
+    tim.close()
+    intact_size = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:
+        f.write(b'0badc0de {"op":"insert","group":1,"extra":[0],"te') # A crash in the middle of an append
+
+    reopened = TiMSystem(num_groups=8, num_tables=2, memory_dir=str(tmp_path))
+    assert memory_state(reopened) == expected
+    assert os.path.getsize(log_path) == intact_size
+    # Operations logged after the truncated tail are recovered too.
+    reopened.memory_cache.insert_thought("Concluded: The tail was torn.")
+    expected = memory_state(reopened)
+    reopened.close()
+    again = TiMSystem(num_groups=8, num_tables=2, memory_dir=str(tmp_path))
+    assert memory_state(again) == expected
+    again.close()
+
+
+def test_interrupted_snapshot_is_ignored(tmp_path):
+    tim, expected = populated(str(tmp_path))
+    generation = tim.memory_log.generation
+    tim.close()
+    current = tmp_path / f"snapshot-{generation}"
+    # A snapshot that crashed while being written, and one that was renamed but never made current.
+    shutil.copytree(current, tmp_path / f"snapshot-{generation + 1}.tmp")
+    (tmp_path / f"snapshot-{generation + 1}.tmp" / "ids.npy").write_bytes(b"")
+    shutil.copytree(current, tmp_path / f"snapshot-{generation + 2}")
+    (tmp_path / f"snapshot-{generation + 2}" / "meta.json").write_text("")
+    (tmp_path / f"oplog-{generation + 2}.log").write_bytes(b"")
+    (tmp_path / "CURRENT.tmp").write_text(str(generation + 2))
+
+    reopened = TiMSystem(num_groups=8, num_tables=2, memory_dir=str(tmp_path))
+    assert reopened.memory_log.generation == generation
+    assert memory_state(reopened) == expected
+    assert sorted(os.listdir(tmp_path)) == ["CURRENT", f"oplog-{generation}.log", f"snapshot-{generation}"]
+    reopened.close()